@@ -0,0 +1,63 @@
+import hmac
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi.responses import FileResponse
+from pydantic import ValidationError
+
+from librarymanagement.core.admission import admission_controllers
+from librarymanagement.core.policy import Policy, current_policy, policy_store
+from librarymanagement.core.profiling import list_profiles
+from librarymanagement.core.settings import settings
+from librarymanagement.service.schema import AdmissionStats, PolicyResponse
+
+
+def require_admin_token(x_admin_token: Annotated[Optional[str], Header()] = None):
+    # Without ADMIN_TOKEN the admin routes are disabled rather than open
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled, ADMIN_TOKEN is not set")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+admin_router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+
+@admin_router.get("/admission")
+def get_admission_stats() -> dict[str, AdmissionStats]:
+    return {route_class: controller.stats() for route_class, controller in admission_controllers.items()}
+
+
+@admin_router.get("/profiles")
+def get_profiles() -> list[str]:
+    return [path.name for path in list_profiles()]
+
+
+@admin_router.get("/profiles/{name}", response_class=FileResponse)
+def get_profile(name: str) -> FileResponse:
+    profiles = {path.name: path for path in list_profiles()}
+    if name not in profiles:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {name}")
+    return FileResponse(profiles[name], media_type="text/plain", filename=name)
+
+
+def policy_response(policy: Policy) -> PolicyResponse:
+    return PolicyResponse(
+        version=policy.version,
+        disabled_genres_create=sorted(policy.disabled_genres_create),
+        disabled_genres_search=sorted(policy.disabled_genres_search),
+        masked_genres=sorted(policy.masked_genres),
+    )
+
+
+@admin_router.get("/settings/policy")
+def get_policy() -> PolicyResponse:
+    return policy_response(current_policy())
+
+
+@admin_router.post("/settings/reload")
+def reload_settings() -> PolicyResponse:
+    try:
+        return policy_response(policy_store.reload())
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid settings, the policy is unchanged: {e}")
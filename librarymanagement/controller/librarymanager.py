@@ -1,20 +1,51 @@
 import logging
-from typing import Optional
+from typing import Optional, Annotated
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Header, Depends
+from fastapi.responses import StreamingResponse, JSONResponse
 
-from librarymanagement.core.exeptions import InvalidBookIdException, LastBookGenreDeleteException
+from librarymanagement.core.admission import admit
+from librarymanagement.core.exeptions import (
+    InvalidBookIdException,
+    LastBookGenreDeleteException,
+    DuplicateBookException,
+)
+from librarymanagement.core.policy import current_policy
 from librarymanagement.core.settings import settings
 from librarymanagement.repository.crud import (
+    BOOK_FIELDS,
     get_all_books,
     insert_book,
     update_books,
     get_book_by_id,
     delete_book_by_id,
+    delete_books_by_ids,
+    get_book_changes,
+    stage_insert_book,
+    stage_update_books,
+    stage_delete_book_by_id,
 )
 from librarymanagement.repository.database import SessionDependency
-from librarymanagement.service.books import group_books_by_genre, mask_titles, mask_title
-from librarymanagement.service.schema import BookListResponse, Book, NewBook, UpdateBook
+from librarymanagement.repository.pipeline import write_pipeline
+from librarymanagement.repository.sharding import sharded_storage
+from librarymanagement.repository.snapshot import catalogue_snapshot
+from librarymanagement.service.books import (
+    group_books_by_genre,
+    group_projected_books_by_genre,
+    mask_titles,
+    mask_title,
+    project_books,
+)
+from librarymanagement.service.events import event_bus, stream_events
+from librarymanagement.service.schema import (
+    BookListResponse,
+    Book,
+    NewBook,
+    UpdateBook,
+    BulkDeleteResponse,
+    BookChangesResponse,
+    BookRow,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -22,80 +53,174 @@ logger = logging.getLogger(__name__)
 book_router = APIRouter()
 
 
-@book_router.get("/")
+def parse_fields(fields: Optional[str] = None) -> Optional[tuple[str, ...]]:
+    """The book fields requested with ``fields=id,title,...``, ``None`` for the full books."""
+    if fields is None:
+        return None
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in BOOK_FIELDS]
+    if unknown or not requested:
+        logger.info(f"Invalid fields requested: {fields}")
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {fields}, available: {', '.join(BOOK_FIELDS)}")
+    return requested
+
+
+FieldsDependency = Annotated[Optional[tuple[str, ...]], Depends(parse_fields)]
+
+
+def find_books(session, fields: Optional[tuple[str, ...]] = None, **filters) -> list[BookRow]:
+    if sharded_storage:
+        return sharded_storage.get_all_books(**filters)
+    if settings.read_engine == "snapshot":
+        return catalogue_snapshot.get_all_books(session, **filters)
+    if fields:
+        # Only the SQLite read path narrows the SELECT, the other engines hold full rows anyway
+        filters["fields"] = fields
+    return get_all_books(session, **filters)
+
+
+@book_router.get("/", dependencies=[admit("list")])
 def get_books(
     session: SessionDependency,
+    fields: FieldsDependency,
     author: Optional[str] = None,
     title: Optional[str] = None,
 ) -> list[Book]:
     if author or title:
-        books = get_all_books(
+        books = find_books(
             session,
+            fields,
             author=author,
             title=title,
-            excluded_genres=settings.disabled_genres_search,
+            excluded_genres=current_policy().disabled_genres_search,
         )
     else:
-        books = get_all_books(session)
+        books = find_books(session, fields)
+    if fields:
+        return JSONResponse(project_books(books, fields))
     masked_books = mask_titles(books)
     return masked_books
 
 
 @book_router.post("/")
 def create_book(session: SessionDependency, book: NewBook) -> Book:
-    if book.genre in settings.disabled_genres_create:
+    if book.genre in current_policy().disabled_genres_create:
         logger.info(f"Cannot create book in the genre {book.genre}")
         raise HTTPException(status_code=400, detail=f"Cannot create book in the genre {book.genre}")
-    return insert_book(session, book)
+    try:
+        if sharded_storage:
+            return sharded_storage.insert_book(book, settings.duplicate_books)
+        if write_pipeline.running:
+            return write_pipeline.submit(stage_insert_book, book, settings.duplicate_books)
+        return insert_book(session, book, settings.duplicate_books)
+    except DuplicateBookException as e:
+        logger.info(f"Book already exists with id {e.id}")
+        raise HTTPException(status_code=409, detail=str(e))
 
 
 @book_router.patch("/")
 def update_book(session: SessionDependency, books: list[UpdateBook]) -> list[Book]:
     for book in books:
-        if book.genre in settings.disabled_genres_create:
+        if book.genre in current_policy().disabled_genres_create:
             logger.info(f"Cannot change genre of book to {book.genre}")
             raise HTTPException(status_code=400, detail=f"Cannot change genre of book to {book.genre}")
 
     try:
-        updated_books = update_books(session, books)
+        if sharded_storage:
+            updated_books = sharded_storage.update_books(books, settings.duplicate_books)
+        elif write_pipeline.running:
+            updated_books = write_pipeline.submit(stage_update_books, books, settings.duplicate_books)
+        else:
+            updated_books = update_books(session, books, settings.duplicate_books)
         return mask_titles(updated_books)
     except InvalidBookIdException as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except DuplicateBookException as e:
+        logger.info(f"Update would duplicate the book with id {e.id}")
+        raise HTTPException(status_code=409, detail=str(e))
 
 
-@book_router.get("/group_by_genre")
+@book_router.post("/bulk_delete")
+def bulk_delete_books(session: SessionDependency, book_ids: list[int]) -> BulkDeleteResponse:
+    if sharded_storage:
+        return sharded_storage.delete_books_by_ids(book_ids)
+    return delete_books_by_ids(session, book_ids)
+
+
+@book_router.get("/group_by_genre", dependencies=[admit("list")])
 def get_books_group_by_genre(
     session: SessionDependency,
+    fields: FieldsDependency,
     author: Optional[str] = None,
     title: Optional[str] = None,
 ) -> BookListResponse:
     if author or title:
-        books = get_all_books(
+        books = find_books(
             session,
+            fields,
             author=author,
             title=title,
-            excluded_genres=settings.disabled_genres_search,
+            excluded_genres=current_policy().disabled_genres_search,
         )
     else:
-        books = get_all_books(session)
+        books = find_books(session, fields)
+    if fields:
+        return JSONResponse(group_projected_books_by_genre(books, fields))
     masked_books = mask_titles(books)
     return group_books_by_genre(masked_books)
 
 
-@book_router.get("/{book_id}")
-def get_book(session: SessionDependency, book_id: int) -> Book:
+@book_router.get("/changes", dependencies=[admit("list")])
+def get_changes(
+    session: SessionDependency,
+    since: int = 0,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+) -> BookChangesResponse:
+    if sharded_storage:
+        raise HTTPException(status_code=501, detail="The change feed is not available with sharded storage")
+    changes = get_book_changes(session, since=since, limit=limit)
+    masked_genres = current_policy().masked_genres
+    for change in changes.changes:
+        if change.book:
+            change.book = mask_title(change.book, masked_genres)
+    return changes
+
+
+@book_router.get("/events", response_class=StreamingResponse)
+async def get_events(last_event_id: Annotated[Optional[int], Header()] = None) -> StreamingResponse:
+    # Every shard hands out its own versions, so with shards an event id does not identify a change
+    subscription = event_bus.subscribe(last_event_id, check_gaps=not sharded_storage)
+    if sharded_storage and last_event_id is not None:
+        subscription.mark_lagged()
+    return StreamingResponse(stream_events(event_bus, subscription), media_type="text/event-stream")
+
+
+@book_router.get("/{book_id}", dependencies=[admit("point")])
+def get_book(session: SessionDependency, fields: FieldsDependency, book_id: int) -> Book:
     try:
-        book = get_book_by_id(session, book_id)
+        if sharded_storage:
+            book = sharded_storage.get_book_by_id(book_id)
+        elif fields:
+            book = get_book_by_id(session, book_id, fields)
+        else:
+            book = get_book_by_id(session, book_id)
     except InvalidBookIdException as e:
         logger.info(f"Book with id {book_id} not found, {e}")
         raise HTTPException(status_code=404, detail=str(e))
+    if fields:
+        return JSONResponse(project_books([book], fields)[0])
     return mask_title(book)
 
 
 @book_router.delete("/{book_id}", status_code=204)
 def delete_book(session: SessionDependency, book_id: int) -> None:
     try:
-        delete_book_by_id(session, book_id)
+        if sharded_storage:
+            sharded_storage.delete_book_by_id(book_id)
+        elif write_pipeline.running:
+            write_pipeline.submit(stage_delete_book_by_id, book_id)
+        else:
+            delete_book_by_id(session, book_id)
     except InvalidBookIdException as e:
         logger.info(f"Book with id {book_id} not found, {e}")
         raise HTTPException(status_code=404, detail=str(e))
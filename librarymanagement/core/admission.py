@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from collections import deque
+
+from fastapi import Depends, HTTPException
+
+from librarymanagement.core.exeptions import AdmissionRejectedException
+from librarymanagement.core.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded wait queue for one class of routes.
+
+    Only used from the event loop, so the counters need no locking. Waiters are plain futures instead of an
+    ``asyncio.Semaphore`` so the controller is not bound to a single event loop.
+    """
+
+    def __init__(self, route_class: str, max_concurrency: int, max_queue: int):
+        self.route_class = route_class
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejectedException(self.route_class)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was already handed over to this request
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        self.admitted += 1
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot over directly, so the active count stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+admission_controllers = {
+    "list": AdmissionController(
+        "list",
+        max_concurrency=settings.admission_list_max_concurrency,
+        max_queue=settings.admission_list_max_queue,
+    ),
+    "point": AdmissionController(
+        "point",
+        max_concurrency=settings.admission_point_max_concurrency,
+        max_queue=settings.admission_point_max_queue,
+    ),
+}
+
+
+def admit(route_class: str):
+    """Route dependency that holds a slot of ``route_class`` for the duration of the request."""
+
+    async def admission_dependency():
+        controller = admission_controllers[route_class]
+        try:
+            await controller.acquire()
+        except AdmissionRejectedException as e:
+            logger.info(f"Rejected {route_class} request, {e}")
+            raise HTTPException(
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(settings.admission_retry_after)},
+            )
+        try:
+            yield
+        finally:
+            controller.release()
+
+    return Depends(admission_dependency)
@@ -8,3 +8,21 @@ class LastBookGenreDeleteException(Exception):
     def __init__(self, id):
         self.id = id
         super().__init__(f"Last book in genre cannot be deleted: {id}")
+
+
+class AdmissionRejectedException(Exception):
+    def __init__(self, route_class):
+        self.route_class = route_class
+        super().__init__(f"Too many concurrent {route_class} requests, try again later")
+
+
+class DuplicateBookException(Exception):
+    def __init__(self, id):
+        self.id = id
+        super().__init__(f"Book already exists: {id}")
+
+
+class SchemaMismatchException(Exception):
+    def __init__(self, columns):
+        self.columns = columns
+        super().__init__(f"Database is missing columns without a migration: {', '.join(columns)}")
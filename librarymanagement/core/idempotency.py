@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import logging
+
+import anyio
+from starlette.responses import JSONResponse, Response
+
+from librarymanagement.repository.idempotency_store import StoredResponse, idempotency_store
+
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+# Method and path, without trailing slash, of the routes that accept an Idempotency-Key header
+IDEMPOTENT_ROUTES = {("POST", "/books"), ("PATCH", "/books")}
+
+
+def request_hash(method: str, path: str, body: bytes) -> str:
+    return hashlib.sha256(b"\0".join([method.encode(), path.encode(), body])).hexdigest()
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+class IdempotencyMiddleware:
+    """Replays the stored response of ``POST /books`` and ``PATCH /books`` requests retried with an ``Idempotency-Key``.
+
+    Successful responses are stored under their key together with a hash of the request, a retry is answered from the
+    store without running validation or writes again, and reusing a key for a different request is rejected with a 422.
+    Duplicates that arrive while the first request with their key is still running wait for it and get its response.
+    That coalescing is per worker process, across workers the store is only consulted before the request runs.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        key = None
+        if scope["type"] == "http" and (scope["method"], scope["path"].rstrip("/")) in IDEMPOTENT_ROUTES:
+            key = dict(scope["headers"]).get(IDEMPOTENCY_KEY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = key.decode("latin-1")
+        if len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters"}, 400)
+            await response(scope, receive, send)
+            return
+
+        body = await read_body(receive)
+        current_hash = request_hash(scope["method"], scope["path"].rstrip("/"), body)
+
+        while (in_flight := self._in_flight.get(key)) is not None:
+            stored = await asyncio.shield(in_flight)
+            if stored is not None:
+                await self.replay(stored, current_hash, scope, receive, send)
+                return
+            # The request with this key failed without a response, this duplicate runs by itself
+
+        in_flight = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        stored = None
+        try:
+            stored = await anyio.to_thread.run_sync(idempotency_store.get, key)
+            if stored is not None:
+                await self.replay(stored, current_hash, scope, receive, send)
+                return
+
+            stored = await self.run(scope, body, current_hash, receive, send)
+            if 200 <= stored.status_code < 300:
+                await anyio.to_thread.run_sync(idempotency_store.put, key, stored)
+        finally:
+            del self._in_flight[key]
+            in_flight.set_result(stored)
+
+    async def run(self, scope, body: bytes, current_hash: str, receive, send) -> StoredResponse:
+        """Run the request with its buffered body, capturing the response while it is sent."""
+        body_sent = False
+        status_code, content_type, response_body = 500, "application/json", []
+
+        async def receive_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send_and_capture(message):
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"").decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive_body, send_and_capture)
+        return StoredResponse(current_hash, status_code, content_type, b"".join(response_body))
+
+    async def replay(self, stored: StoredResponse, current_hash: str, scope, receive, send):
+        if stored.request_hash != current_hash:
+            response = JSONResponse({"detail": "Idempotency-Key was already used for a different request"}, 422)
+        else:
+            logger.info(f"Replaying stored response for {scope['method']} {scope['path']}")
+            response = Response(
+                stored.body,
+                status_code=stored.status_code,
+                media_type=stored.content_type,
+                headers={"Idempotent-Replayed": "true"},
+            )
+        await response(scope, receive, send)
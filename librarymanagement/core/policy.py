@@ -0,0 +1,106 @@
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from pydantic import ValidationError
+
+from librarymanagement.core.settings import Settings, settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class Policy(NamedTuple):
+    """The genre rules of the settings, immutable so requests read them without a lock while a reload replaces them."""
+
+    disabled_genres_create: frozenset[str]
+    disabled_genres_search: frozenset[str]
+    masked_genres: frozenset[str]
+    version: int = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings, version: int = 0) -> "Policy":
+        return cls(
+            frozenset(settings.disabled_genres_create or ()),
+            frozenset(settings.disabled_genres_search or ()),
+            frozenset(settings.masked_genres or ()),
+            version,
+        )
+
+    def same_rules(self, other: "Policy") -> bool:
+        return self[:-1] == other[:-1]
+
+
+def env_file_mtime(env_file: str) -> Optional[float]:
+    try:
+        return os.stat(env_file).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class PolicyStore:
+    """Holds the current policy and swaps in a new one when the settings are reloaded.
+
+    A reload reads the environment and the .env file again, through ``reload()`` or when the modification time of the
+    .env file changes, which is checked at most every ``check_interval`` seconds. Every worker process checks the file
+    by itself, so an edited .env reaches all workers without a restart. Only the genre rules are reloaded, the other
+    settings keep the values the process started with.
+    """
+
+    def __init__(self, policy: Policy, env_file: str = ".env", check_interval: float = 0):
+        self.policy = policy
+        self.env_file = env_file
+        self.check_interval = check_interval
+        self._reload_lock = threading.Lock()
+        self._env_mtime = env_file_mtime(env_file)
+        self._next_check = time.monotonic() + check_interval
+
+    def current(self) -> Policy:
+        if self.check_interval and time.monotonic() >= self._next_check:
+            self._check_env_file()
+        return self.policy
+
+    def reload(self) -> Policy:
+        """Read the settings again and swap in their policy. Raises ``ValidationError`` for invalid settings."""
+        with self._reload_lock:
+            self._env_mtime = env_file_mtime(self.env_file)
+            return self._load()
+
+    def _check_env_file(self):
+        # Requests that find another thread checking keep using the current policy instead of waiting
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            mtime = env_file_mtime(self.env_file)
+            if mtime == self._env_mtime:
+                return
+            self._env_mtime = mtime
+            try:
+                self._load()
+            except ValidationError as e:
+                logger.error(f"Keeping policy version {self.policy.version}, {self.env_file} is invalid: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def _load(self) -> Policy:
+        policy = Policy.from_settings(Settings(_env_file=self.env_file), self.policy.version + 1)
+        if policy.same_rules(self.policy):
+            return self.policy
+        # A single reference assignment, requests see either the old or the new policy as a whole
+        self.policy = policy
+        logger.info(f"Loaded policy version {policy.version}")
+        return policy
+
+
+policy_store = PolicyStore(
+    Policy.from_settings(settings),
+    env_file=Settings.model_config["env_file"],
+    check_interval=settings.settings_reload_interval_s,
+)
+
+
+def current_policy() -> Policy:
+    return policy_store.current()
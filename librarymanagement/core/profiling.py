@@ -0,0 +1,146 @@
+import hashlib
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+import anyio
+
+from librarymanagement.core.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+PROFILE_ID_HEADER = b"x-profile-id"
+PROFILE_SUFFIX = ".collapsed"
+
+# A thread whose innermost Python frame is in one of these modules is waiting for work rather than doing it
+IDLE_MODULES = {"threading.py", "selectors.py", "queue.py"}
+
+
+def sign_profile_token(secret: str, expires_at: int) -> str:
+    signature = hmac.new(secret.encode(), str(expires_at).encode(), hashlib.sha256).hexdigest()
+    return f"{expires_at}.{signature}"
+
+
+def is_valid_profile_token(secret: Optional[str], token: str) -> bool:
+    if not secret:
+        return False
+    expires_at, _, _ = token.partition(".")
+    # isdigit() alone also accepts digits int() does not parse, and compare_digest() only takes ASCII strings
+    if not (expires_at.isascii() and expires_at.isdigit()) or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(token.encode(), sign_profile_token(secret, int(expires_at)).encode())
+
+
+def collapse_stack(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class StackSampler:
+    """Samples the Python stacks of all busy threads at a fixed interval.
+
+    Sync routes run their dependencies, the endpoint and the response validation on threadpool workers, so a
+    single-thread profiler cannot follow a request. Samples of other requests served at the same time are included.
+    Sampling ends after ``max_duration`` seconds, so a long-lived response such as an event stream is not sampled for
+    as long as it is open.
+    """
+
+    def __init__(self, interval: float, max_duration: Optional[float] = None):
+        self.interval = interval
+        self.max_duration = max_duration
+        self.samples = Counter()
+        self.truncated = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + self.max_duration if self.max_duration else None
+        while not self._stopped.wait(self.interval):
+            if deadline is not None and time.monotonic() >= deadline:
+                self.truncated = True
+                return
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident or os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                self.samples[collapse_stack(frame)] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def list_profiles() -> list[Path]:
+    profile_dir = Path(settings.profiling_dir)
+    if not profile_dir.is_dir():
+        return []
+    return sorted(profile_dir.glob(f"*{PROFILE_SUFFIX}"), key=lambda path: path.name)
+
+
+def write_profile(name: str, collapsed: str):
+    profile_dir = Path(settings.profiling_dir)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    (profile_dir / name).write_text(collapsed)
+
+    profiles = list_profiles()
+    for path in profiles[: max(len(profiles) - settings.profiling_max_files, 0)]:
+        path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """Profiles sampled requests, or requests carrying a valid ``X-Profile-Token`` header.
+
+    Profiles are written as collapsed stacks to a bounded ring of files in ``PROFILING_DIR``, and the file name is
+    returned in the ``X-Profile-Id`` response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def should_profile(self, scope) -> bool:
+        token = dict(scope["headers"]).get(PROFILE_TOKEN_HEADER)
+        if token is not None and is_valid_profile_token(settings.profiling_secret, token.decode("latin-1")):
+            return True
+        return random.random() < settings.profiling_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"].strip("/").replace("/", "_") or "root"
+        name = f"{time.time_ns()}-{scope['method']}-{path}{PROFILE_SUFFIX}"
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER, name.encode())]
+            await send(message)
+
+        sampler = StackSampler(settings.profiling_interval_ms / 1000, settings.profiling_max_duration_s)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            truncated = f", the first {sampler.max_duration} seconds only" if sampler.truncated else ""
+            logger.info(f"Writing profile {name} with {sampler.samples.total()} samples{truncated}")
+            await anyio.to_thread.run_sync(write_profile, name, sampler.collapsed())
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -8,6 +8,32 @@ class Settings(BaseSettings):
     disabled_genres_create: Optional[List[str]] = ["Horror"]
     disabled_genres_search: Optional[List[str]] = ["18+"]
     masked_genres: Optional[List[str]] = ["18+"]
+    settings_reload_interval_s: float = 5
+    read_engine: Literal["sqlite", "snapshot"] = "sqlite"
+    snapshot_coherence_check: bool = True
+    snapshot_max_replay: int = 10000
+    duplicate_books: Literal["allow", "reject", "return_existing"] = "allow"
+    storage_shards: int = 0
+    storage_shard_dir: str = "shards"
+    write_pipeline_enabled: bool = False
+    write_pipeline_max_batch_size: int = 64
+    write_pipeline_max_batch_delay_ms: float = 5
+    idempotency_key_ttl_s: int = 86400
+    idempotency_compaction_interval_s: int = 3600
+    event_replay_size: int = 1000
+    event_subscriber_queue_size: int = 100
+    admission_list_max_concurrency: int = 4
+    admission_list_max_queue: int = 16
+    admission_point_max_concurrency: int = 32
+    admission_point_max_queue: int = 128
+    admission_retry_after: int = 1
+    admin_token: Optional[str] = None
+    profiling_secret: Optional[str] = None
+    profiling_sample_rate: float = 0.0
+    profiling_interval_ms: float = 1
+    profiling_max_duration_s: float = 10
+    profiling_dir: str = "profiles"
+    profiling_max_files: int = 20
 
 
 settings = Settings()
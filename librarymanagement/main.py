@@ -1,15 +1,40 @@
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from sqlalchemy.orm import Session
+
+from librarymanagement.controller.admin import admin_router
 from librarymanagement.controller.librarymanager import book_router
-from librarymanagement.repository.database import Base, engine
+from librarymanagement.core.idempotency import IdempotencyMiddleware
+from librarymanagement.core.profiling import ProfilingMiddleware
+from librarymanagement.core.settings import settings
+from librarymanagement.repository.crud import get_data_version
+from librarymanagement.repository.database import engine, ensure_schema
+from librarymanagement.repository.pipeline import write_pipeline
+from librarymanagement.repository.sharding import sharded_storage
+from librarymanagement.service.events import event_bus
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(engine)  # Create tables
+    ensure_schema(engine)  # Create tables, skipped when the schema is already current
+    if sharded_storage:
+        sharded_storage.ensure_schema()
+    else:
+        # Event ids are change versions, the first event after a restart must not look like a skipped version
+        with Session(engine) as db:
+            event_bus.start_at(get_data_version(db))
+    if settings.write_pipeline_enabled:
+        write_pipeline.start(
+            max_batch_size=settings.write_pipeline_max_batch_size,
+            max_batch_delay=settings.write_pipeline_max_batch_delay_ms / 1000,
+        )
     yield
+    write_pipeline.stop()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(ProfilingMiddleware)
 app.include_router(book_router, prefix="/books", tags=["books"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"])
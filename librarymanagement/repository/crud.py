@@ -1,11 +1,72 @@
-from typing import Optional, List
+import heapq
+from itertools import groupby
+from operator import itemgetter
+from typing import Optional, List, Iterator, Collection
 
-from sqlalchemy import select, or_, func
+from sqlalchemy import select, or_, func, delete, insert, update, event, bindparam
 from sqlalchemy.orm import Session
 
-from librarymanagement.core.exeptions import InvalidBookIdException, LastBookGenreDeleteException
-from librarymanagement.repository.models import BookORM
-from librarymanagement.service.schema import Book, NewBook, UpdateBook
+from librarymanagement.core.exeptions import (
+    InvalidBookIdException,
+    LastBookGenreDeleteException,
+    DuplicateBookException,
+)
+from librarymanagement.repository.database import lock_for_write
+from librarymanagement.repository.models import (
+    BookORM,
+    BookTombstoneORM,
+    content_hash,
+    current_version,
+)
+from librarymanagement.service.events import event_bus
+from librarymanagement.service.schema import (
+    BookRow,
+    NewBook,
+    UpdateBook,
+    BulkDeleteResponse,
+    BookChange,
+    BookChangesResponse,
+)
+
+BULK_CHUNK_SIZE = 500
+
+# Updating one of these fields changes the content hash of a book
+CONTENT_FIELDS = {"title", "author", "publication_year"}
+
+BOOK_COLUMNS = (BookORM.id, BookORM.title, BookORM.author, BookORM.publication_year, BookORM.genre)
+
+BOOK_FIELDS = tuple(column.key for column in BOOK_COLUMNS)
+
+
+def chunks(items: list):
+    for start in range(0, len(items), BULK_CHUNK_SIZE):
+        yield items[start : start + BULK_CHUNK_SIZE]
+
+
+def book_columns(fields: Optional[Collection[str]] = None) -> tuple:
+    """The columns to select for ``fields``, always including the genre that titles are masked by."""
+    if fields is None:
+        return BOOK_COLUMNS
+    return tuple(column for column in BOOK_COLUMNS if column.key in fields or column.key == "genre")
+
+
+def _book_row(book_orm: BookORM) -> BookRow:
+    return BookRow(book_orm.id, book_orm.title, book_orm.author, book_orm.publication_year, book_orm.genre)
+
+
+def _stage_event(db: Session, event_type: str, book_id: int, version: int, book: Optional[BookRow] = None):
+    db.info.setdefault("pending_events", []).append((event_type, book_id, version, book))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending_events(session: Session):
+    for pending_event in session.info.pop("pending_events", []):
+        event_bus.publish(*pending_event)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_events(session: Session):
+    session.info.pop("pending_events", None)
 
 
 def get_all_books(
@@ -13,14 +74,16 @@ def get_all_books(
     author: Optional[str] = None,
     title: Optional[str] = None,
     excluded_genres=None,
-) -> List[Book]:
+    fields: Optional[Collection[str]] = None,
+) -> List[BookRow]:
+    """Books matching the filters, with ``fields`` only those columns and the genre are selected into plain rows."""
     filters = []
     if author:
         filters.append(BookORM.author.ilike(f"%{author}%"))
     if title:
         filters.append(BookORM.title.ilike(f"%{title}%"))
 
-    query = select(BookORM)
+    query = select(*book_columns(fields))
 
     if filters:
         query = query.filter(or_(*filters))
@@ -28,48 +91,309 @@ def get_all_books(
     if excluded_genres:
         query = query.filter(~BookORM.genre.in_(excluded_genres))
 
-    query_result = db.execute(query).scalars().all()
-    return [Book.model_validate(row, from_attributes=True) for row in query_result]
+    # Plain column tuples, no ORM objects in the identity map and no Pydantic models on the read path
+    if fields is not None:
+        return db.execute(query).all()
+    return list(map(BookRow._make, db.execute(query)))
 
 
-def get_book_by_id(db: Session, book_id: int) -> Book:
-    query_result = db.execute(select(BookORM).filter(BookORM.id == book_id)).scalar_one_or_none()
+def get_book_by_id(db: Session, book_id: int, fields: Optional[Collection[str]] = None) -> BookRow:
+    query_result = db.execute(select(*book_columns(fields)).filter(BookORM.id == book_id)).one_or_none()
     if not query_result:
         raise InvalidBookIdException(book_id)
-    return Book.model_validate(query_result, from_attributes=True)
+    return query_result if fields is not None else BookRow._make(query_result)
 
 
-def insert_book(db: Session, book: NewBook) -> Book:
-    book_orm = BookORM(**book.model_dump())
+def find_duplicate(
+    db: Session,
+    title: str,
+    author: str,
+    publication_year: int,
+    exclude_id: Optional[int] = None,
+) -> Optional[BookRow]:
+    """A book with the same content hash, a lookup on the content hash index."""
+    query = select(*BOOK_COLUMNS).where(BookORM.content_hash == content_hash(title, author, publication_year))
+    if exclude_id is not None:
+        query = query.where(BookORM.id != exclude_id)
+    duplicate = db.execute(query.order_by(BookORM.id).limit(1)).first()
+    return BookRow._make(duplicate) if duplicate else None
+
+
+def stage_insert_book(
+    db: Session,
+    book: NewBook,
+    on_duplicate: str = "allow",
+    book_id: Optional[int] = None,
+    event_type: str = "created",
+) -> BookRow:
+    """Add a book, staging an ``event_type`` event. A book moved from another shard keeps its id and is ``updated``."""
+    if on_duplicate != "allow":
+        # The lookup and the insert form one critical section, a concurrent insert of the same book waits for the commit
+        lock_for_write(db.connection())
+        duplicate = find_duplicate(db, book.title, book.author, book.publication_year)
+        if duplicate and on_duplicate == "reject":
+            raise DuplicateBookException(duplicate.id)
+        if duplicate:
+            return duplicate
+
+    book_orm = BookORM(id=book_id, **book.model_dump())
     db.add(book_orm)
+    db.flush()
+
+    inserted_book = _book_row(book_orm)
+    _stage_event(db, event_type, inserted_book.id, book_orm.version, inserted_book)
+    return inserted_book
+
+
+def insert_book(
+    db: Session,
+    book: NewBook,
+    on_duplicate: str = "allow",
+    book_id: Optional[int] = None,
+) -> BookRow:
+    try:
+        inserted_book = stage_insert_book(db, book, on_duplicate, book_id)
+    except DuplicateBookException:
+        db.rollback()
+        raise
     db.commit()
 
-    return Book.model_validate(book_orm, from_attributes=True)
+    return inserted_book
 
 
-def update_books(db: Session, books: list[UpdateBook]) -> list[Book]:
-    db.begin()
-    updated_books = []
+def _check_duplicate_updates(db: Session, changed_ids: list[int], content_hashes: dict[int, str]):
+    """Reject updates whose new content hash is taken by another book, in the batch or outside of it."""
+    batch_ids = {}
+    for book_id, book_hash in content_hashes.items():
+        batch_ids.setdefault(book_hash, []).append(book_id)
+    for book_id in changed_ids:
+        others = [other_id for other_id in batch_ids[content_hashes[book_id]] if other_id != book_id]
+        if others:
+            raise DuplicateBookException(others[0])
+
+    changed_hashes = list(dict.fromkeys(content_hashes[book_id] for book_id in changed_ids))
+    for chunk in chunks(changed_hashes):
+        duplicate = db.execute(
+            select(BookORM.id)
+            .where(BookORM.content_hash.in_(chunk), BookORM.id.not_in(list(content_hashes)))
+            .order_by(BookORM.id)
+            .limit(1)
+        ).scalar()
+        if duplicate is not None:
+            raise DuplicateBookException(duplicate)
+
+
+def stage_update_books(db: Session, books: list[UpdateBook], on_duplicate: str = "allow") -> list[BookRow]:
+    """Apply updates with one chunked lookup and one batched UPDATE, whatever the number of books.
+
+    With ``on_duplicate`` other than ``allow`` an update that turns a book into a duplicate of another book is rejected.
+    """
+    # Every column and the content hash are written from the rows read here, a concurrent update of other fields of
+    # the same books must not commit in between
+    lock_for_write(db.connection())
+    current_books = {}
+    for chunk in chunks(list(dict.fromkeys(book.id for book in books))):
+        current_books.update(
+            (row.id, row) for row in map(BookRow._make, db.execute(select(*BOOK_COLUMNS).where(BookORM.id.in_(chunk))))
+        )
+
+    changed_ids = []
     for book in books:
-        book_orm = db.execute(select(BookORM).filter(BookORM.id == book.id)).scalar_one_or_none()
-        if not book_orm:
-            db.rollback()
+        if book.id not in current_books:
             raise InvalidBookIdException(book.id)
-        for key, value in book.model_dump(exclude="id").items():
-            if value is not None:
-                setattr(book_orm, key, value)
-        updated_books.append(book_orm)
+        changes = book.model_dump(exclude="id", exclude_none=True)
+        current_books[book.id] = current_books[book.id]._replace(**changes)
+        if CONTENT_FIELDS & changes.keys():
+            changed_ids.append(book.id)
+    if not current_books:
+        return []
+
+    content_hashes = {
+        book_id: content_hash(book.title, book.author, book.publication_year) for book_id, book in current_books.items()
+    }
+    if on_duplicate != "allow":
+        _check_duplicate_updates(db, changed_ids, content_hashes)
+
+    # A Core executemany bypasses the ORM update events, so the version and content hash are set here. No other writer
+    # can allocate versions while the write lock is held, every book gets its own.
+    first_version = db.execute(select(current_version())).scalar() + 1
+    versions = {book_id: version for version, book_id in enumerate(current_books, start=first_version)}
+    books_table = BookORM.__table__
+    db.execute(
+        update(books_table)
+        .where(books_table.c.id == bindparam("book_id"))
+        .values(
+            title=bindparam("new_title"),
+            author=bindparam("new_author"),
+            publication_year=bindparam("new_publication_year"),
+            genre=bindparam("new_genre"),
+            content_hash=bindparam("new_content_hash"),
+            version=bindparam("new_version"),
+        ),
+        [
+            {
+                "book_id": book_id,
+                "new_title": book.title,
+                "new_author": book.author,
+                "new_publication_year": book.publication_year,
+                "new_genre": book.genre,
+                "new_content_hash": content_hashes[book_id],
+                "new_version": versions[book_id],
+            }
+            for book_id, book in current_books.items()
+        ],
+    )
+
+    # Books loaded as ORM objects earlier in the session, e.g. inserted in the same write pipeline batch, are stale now
+    for instance in list(db.identity_map.values()):
+        if isinstance(instance, BookORM) and instance.id in current_books:
+            db.expire(instance)
+
+    for book_id, book in current_books.items():
+        _stage_event(db, "updated", book_id, versions[book_id], book)
+    return [current_books[book.id] for book in books]
+
+
+def update_books(db: Session, books: list[UpdateBook], on_duplicate: str = "allow") -> list[BookRow]:
+    db.begin()
+    try:
+        updated_books = stage_update_books(db, books, on_duplicate)
+    except (InvalidBookIdException, DuplicateBookException):
+        db.rollback()
+        raise
     db.commit()
 
-    return [Book.model_validate(book, from_attributes=True) for book in updated_books]
+    return updated_books
 
 
-def delete_book_by_id(db: Session, book_id: int):
+def stage_delete_book_by_id(db: Session, book_id: int):
     book_orm = db.execute(select(BookORM).filter(BookORM.id == book_id)).scalar_one_or_none()
     if not book_orm:
         raise InvalidBookIdException(book_id)
     count = db.execute(select(func.count()).select_from(BookORM).where(BookORM.genre == book_orm.genre)).scalar()
     if count == 1:
         raise LastBookGenreDeleteException(book_id)
+    # The tombstone is written before the delete so its version is allocated above the deleted book's version
+    tombstone = BookTombstoneORM(book_id=book_id)
+    db.add(tombstone)
+    db.flush()
     db.delete(book_orm)
+    db.flush()
+    _stage_event(db, "deleted", book_id, tombstone.version)
+
+
+def delete_book_by_id(db: Session, book_id: int):
+    stage_delete_book_by_id(db, book_id)
+    db.commit()
+
+
+def stage_move_out_book(db: Session, book_id: int):
+    """Remove a book that was moved to another shard, with a tombstone but no event, the book still exists."""
+    tombstone = BookTombstoneORM(book_id=book_id)
+    db.add(tombstone)
+    db.flush()
+    if db.execute(delete(BookORM).where(BookORM.id == book_id)).rowcount == 0:
+        raise InvalidBookIdException(book_id)
+
+
+def stage_delete_books_by_ids(db: Session, book_ids: list[int]) -> BulkDeleteResponse:
+    book_ids = list(dict.fromkeys(book_ids))
+    # The genre counts must stay current until the deletes are committed
+    lock_for_write(db.connection())
+    genre_counts = dict(db.execute(select(BookORM.genre, func.count()).group_by(BookORM.genre)).all())
+
+    book_genres = {}
+    for chunk in chunks(book_ids):
+        book_genres.update(db.execute(select(BookORM.id, BookORM.genre).where(BookORM.id.in_(chunk))).all())
+
+    # Skip only the deletions that would leave a genre without any books. Unknown ids are reported instead of failing
+    # the request, so a retry of a request that timed out deletes the rest.
+    deleted, skipped, not_found = [], [], []
+    for book_id in book_ids:
+        genre = book_genres.get(book_id)
+        if genre is None:
+            not_found.append(book_id)
+        elif genre_counts[genre] == 1:
+            skipped.append(book_id)
+        else:
+            genre_counts[genre] -= 1
+            deleted.append(book_id)
+
+    # Versions in id order, under the write lock, so the events go out in version order
+    versions = {}
+    if deleted:
+        first_version = db.execute(select(current_version())).scalar() + 1
+        versions = {book_id: version for version, book_id in enumerate(sorted(deleted), start=first_version)}
+        tombstones = [{"book_id": book_id, "version": version} for book_id, version in versions.items()]
+        db.execute(insert(BookTombstoneORM), tombstones)
+    for chunk in chunks(deleted):
+        db.execute(delete(BookORM).where(BookORM.id.in_(chunk)))
+    for book_id, version in versions.items():
+        _stage_event(db, "deleted", book_id, version)
+    return BulkDeleteResponse(deleted=deleted, skipped=skipped, not_found=not_found)
+
+
+def delete_books_by_ids(db: Session, book_ids: list[int]) -> BulkDeleteResponse:
+    try:
+        result = stage_delete_books_by_ids(db, book_ids)
+    except Exception:
+        # Release the write lock right away instead of when the session is closed
+        db.rollback()
+        raise
     db.commit()
+
+    return result
+
+
+def iter_duplicate_groups(db: Session) -> Iterator[list[BookRow]]:
+    """Yield the books sharing a content hash, group by group.
+
+    Streams the content hash index in hash order, which also yields the ids without reading the table, so only the ids
+    of one group are held at a time and only the books of groups with duplicates are loaded.
+    """
+    hashes = db.execute(
+        select(BookORM.content_hash, BookORM.id)
+        .order_by(BookORM.content_hash, BookORM.id)
+        .execution_options(yield_per=1000)
+    )
+    for _, group in groupby(hashes, key=itemgetter(0)):
+        book_ids = [book_id for _, book_id in group]
+        if len(book_ids) > 1:
+            books = db.execute(select(*BOOK_COLUMNS).where(BookORM.id.in_(book_ids)).order_by(BookORM.id))
+            yield list(map(BookRow._make, books))
+
+
+def get_data_version(db: Session) -> int:
+    """Version of the latest committed change by any process, two index lookups on the version columns."""
+    return db.execute(select(current_version())).scalar()
+
+
+def get_book_changes(db: Session, since: int = 0, limit: int = 100) -> BookChangesResponse:
+    # Only changes up to a version that is already committed are returned, so a change committed between the two
+    # queries below cannot be skipped by the next token
+    until = get_data_version(db)
+
+    books = db.execute(
+        select(*BOOK_COLUMNS, BookORM.version)
+        .where(BookORM.version > since, BookORM.version <= until)
+        .order_by(BookORM.version)
+        .limit(limit + 1)
+    )
+    tombstones = db.execute(
+        select(BookTombstoneORM.book_id, BookTombstoneORM.version)
+        .where(BookTombstoneORM.version > since, BookTombstoneORM.version <= until)
+        .order_by(BookTombstoneORM.version)
+        .limit(limit + 1)
+    ).all()
+
+    changes = heapq.merge(
+        (BookChange(version=row.version, id=row.id, book=BookRow._make(row[:-1])) for row in books),
+        (BookChange(version=version, id=book_id, deleted=True) for book_id, version in tombstones),
+        key=lambda change: change.version,
+    )
+    changes = [change for _, change in zip(range(limit + 1), changes)]
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    next_token = changes[-1].version if has_more else max(until, since)
+    return BookChangesResponse(changes=changes, next_token=next_token, has_more=has_more)
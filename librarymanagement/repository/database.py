@@ -1,13 +1,103 @@
-from typing import Annotated
+import hashlib
+from typing import Annotated, Callable
 
 from fastapi import Depends
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, Connection, Engine, MetaData
 from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.schema import CreateTable, CreateIndex
+
+from librarymanagement.core.exeptions import SchemaMismatchException
 
 engine = create_engine("sqlite:///library.db", echo=True, connect_args={"check_same_thread": False})
 
 Base = declarative_base()
 
+# Tables of the id directory of the sharded storage, kept apart from the tables created in every shard
+DirectoryBase = declarative_base()
+
+
+# Functions that add one column to a table created by an earlier version of the schema and fill it for the existing
+# rows, keyed by table and column name. Registered by the models with ``column_migration``.
+column_migrations: dict[tuple[str, str], Callable[[Connection], None]] = {}
+
+
+def column_migration(table: str, column: str):
+    def register(migration: Callable[[Connection], None]):
+        column_migrations[(table, column)] = migration
+        return migration
+
+    return register
+
+
+def lock_for_write(connection: Connection):
+    """Take SQLite's write lock now, so nothing is committed by others between the reads that follow and the commit.
+
+    pysqlite only begins a transaction at the first INSERT, UPDATE or DELETE, reads before it are not isolated.
+    """
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def schema_fingerprint(bind: Engine, metadata: MetaData = Base.metadata) -> int:
+    statements = []
+    for table in metadata.sorted_tables:
+        statements.append(CreateTable(table))
+        statements.extend(CreateIndex(index) for index in sorted(table.indexes, key=lambda index: index.name))
+    ddl = ";".join(str(statement.compile(dialect=bind.dialect)) for statement in statements)
+    # PRAGMA user_version holds a signed 32 bit integer
+    return int.from_bytes(hashlib.sha256(ddl.encode()).digest()[:4], "big") & 0x7FFFFFFF
+
+
+def migrate(connection: Connection, metadata: MetaData):
+    """Add the columns and indexes that tables created by an earlier version of the schema are missing.
+
+    Raises ``SchemaMismatchException`` for missing columns without a registered migration.
+    """
+    inspector = inspect(connection)
+    missing = []
+    for table in metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        unmigrated = [
+            f"{table.name}.{column.name}"
+            for column in table.columns
+            if column.name not in columns and (table.name, column.name) not in column_migrations
+        ]
+        if unmigrated:
+            missing.extend(unmigrated)
+            continue
+        for column in table.columns:
+            if column.name not in columns:
+                column_migrations[(table.name, column.name)](connection)
+
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(connection)
+    if missing:
+        raise SchemaMismatchException(missing)
+
+
+def ensure_schema(bind: Engine, metadata: MetaData = Base.metadata) -> bool:
+    """Create or migrate the tables unless the database is stamped with the current schema fingerprint.
+
+    An already initialised database costs a single ``PRAGMA user_version`` read instead of reflecting every table.
+    Otherwise the missing tables are created and existing ones migrated, all in one transaction that also stamps the
+    fingerprint, so a failed migration leaves the database as it was. Returns whether the DDL was run.
+    """
+    fingerprint = schema_fingerprint(bind, metadata)
+    with bind.connect() as connection:
+        if connection.exec_driver_sql("PRAGMA user_version").scalar() == fingerprint:
+            return False
+    with bind.begin() as connection:
+        # Workers starting at the same time migrate one after the other, the later ones find the stamp
+        lock_for_write(connection)
+        if connection.exec_driver_sql("PRAGMA user_version").scalar() == fingerprint:
+            return False
+        metadata.create_all(connection)
+        migrate(connection, metadata)
+        connection.exec_driver_sql(f"PRAGMA user_version = {fingerprint}")
+    return True
+
 
 def get_session():
     with Session(engine) as session:
@@ -0,0 +1,80 @@
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from librarymanagement.core.settings import settings
+from librarymanagement.repository.database import engine
+from librarymanagement.repository.models import IdempotencyKeyORM
+
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    content_type: str
+    body: bytes
+
+
+def _expiry_cutoff():
+    # created_at holds SQLite's CURRENT_TIMESTAMP, so the cutoff is computed by SQLite in the same format
+    return func.datetime("now", f"-{settings.idempotency_key_ttl_s} seconds")
+
+
+class IdempotencyStore:
+    """Responses of requests sent with an ``Idempotency-Key`` header, kept for ``IDEMPOTENCY_KEY_TTL_S`` seconds.
+
+    Expired keys are ignored on lookup and overwritten on store. They are deleted by a compaction that runs along with
+    a store at most once every ``IDEMPOTENCY_COMPACTION_INTERVAL_S`` seconds.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = lambda: Session(engine)):
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._last_compaction = time.monotonic()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        """The stored response for ``key``, a single primary key lookup."""
+        with self.session_factory() as db:
+            row = db.execute(
+                select(
+                    IdempotencyKeyORM.request_hash,
+                    IdempotencyKeyORM.status_code,
+                    IdempotencyKeyORM.content_type,
+                    IdempotencyKeyORM.body,
+                ).where(IdempotencyKeyORM.key == key, IdempotencyKeyORM.created_at >= _expiry_cutoff())
+            ).one_or_none()
+        return StoredResponse._make(row) if row else None
+
+    def put(self, key: str, response: StoredResponse):
+        values = response._asdict()
+        with self.session_factory() as db:
+            db.execute(
+                insert(IdempotencyKeyORM)
+                .values(key=key, **values)
+                .on_conflict_do_update(
+                    index_elements=[IdempotencyKeyORM.key],
+                    set_={**values, "created_at": func.now()},
+                    where=IdempotencyKeyORM.created_at < _expiry_cutoff(),
+                )
+            )
+            db.commit()
+
+        with self._lock:
+            compact = time.monotonic() - self._last_compaction >= settings.idempotency_compaction_interval_s
+            if compact:
+                self._last_compaction = time.monotonic()
+        if compact:
+            self.compact()
+
+    def compact(self) -> int:
+        """Delete the expired keys, returns the number of deleted keys."""
+        with self.session_factory() as db:
+            deleted = db.execute(delete(IdempotencyKeyORM).where(IdempotencyKeyORM.created_at < _expiry_cutoff()))
+            db.commit()
+        return deleted.rowcount
+
+
+idempotency_store = IdempotencyStore()
@@ -1,6 +1,11 @@
+import hashlib
+import unicodedata
+from datetime import datetime
+
+from sqlalchemy import event, func, select, Connection
 from sqlalchemy.orm import Mapped, mapped_column
 
-from librarymanagement.repository.database import Base
+from librarymanagement.repository.database import Base, DirectoryBase, column_migration
 
 
 class BookORM(Base):
@@ -9,7 +14,10 @@ class BookORM(Base):
     title: Mapped[str] = mapped_column(nullable=False)
     author: Mapped[str] = mapped_column(nullable=False)
     publication_year: Mapped[int] = mapped_column(nullable=False)
-    genre: Mapped[str] = mapped_column(nullable=False)
+    genre: Mapped[str] = mapped_column(nullable=False, index=True)
+    version: Mapped[int] = mapped_column(nullable=False, index=True)
+    content_hash: Mapped[str] = mapped_column(nullable=False, index=True)
+    updated_at: Mapped[datetime] = mapped_column(nullable=False, default=func.now(), onupdate=func.now())
 
     def __eq__(self, other):
         return (
@@ -20,3 +28,93 @@ class BookORM(Base):
             and self.publication_year == other.publication_year
             and self.genre == other.genre
         )
+
+
+class BookTombstoneORM(Base):
+    __tablename__ = "book_tombstones"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, nullable=False)
+    book_id: Mapped[int] = mapped_column(nullable=False)
+    version: Mapped[int] = mapped_column(nullable=False, index=True)
+    deleted_at: Mapped[datetime] = mapped_column(nullable=False, default=func.now())
+
+
+class IdempotencyKeyORM(Base):
+    __tablename__ = "idempotency_keys"
+    key: Mapped[str] = mapped_column(primary_key=True, nullable=False)
+    request_hash: Mapped[str] = mapped_column(nullable=False)
+    status_code: Mapped[int] = mapped_column(nullable=False)
+    content_type: Mapped[str] = mapped_column(nullable=False)
+    body: Mapped[bytes] = mapped_column(nullable=False)
+    created_at: Mapped[datetime] = mapped_column(nullable=False, default=func.now(), index=True)
+
+
+class BookShardORM(DirectoryBase):
+    __tablename__ = "book_shards"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, nullable=False)
+    shard: Mapped[int] = mapped_column(nullable=False)
+
+
+def content_hash(title: str, author: str, publication_year: int) -> str:
+    """Hash of the title, author and publication year, ignoring case, Unicode compatibility forms and whitespace."""
+    fields = [" ".join(unicodedata.normalize("NFKC", value).casefold().split()) for value in (title, author)]
+    return hashlib.sha256("\0".join([*fields, str(publication_year)]).encode()).hexdigest()
+
+
+def current_version():
+    """The highest change version handed out so far, 0 for an empty catalogue."""
+    return select(
+        func.max(
+            func.coalesce(select(func.max(BookORM.version)).scalar_subquery(), 0),
+            func.coalesce(select(func.max(BookTombstoneORM.version)).scalar_subquery(), 0),
+        )
+    ).scalar_subquery()
+
+
+def next_version():
+    # Evaluated inside the INSERT/UPDATE statement itself, so SQLite's write lock makes the allocation atomic and
+    # versions are handed out in commit order.
+    return current_version() + 1
+
+
+@event.listens_for(BookORM, "before_insert")
+@event.listens_for(BookORM, "before_update")
+@event.listens_for(BookTombstoneORM, "before_insert")
+def assign_version(mapper, connection, target):
+    target.version = next_version()
+
+
+@event.listens_for(BookORM, "before_insert")
+@event.listens_for(BookORM, "before_update")
+def assign_content_hash(mapper, connection, target):
+    target.content_hash = content_hash(target.title, target.author, target.publication_year)
+
+
+# Migrations of a books table created before the change feed and duplicate detection. SQLite only adds NOT NULL
+# columns with a constant default, the existing rows are filled in right after.
+
+
+@column_migration("books", "version")
+def add_book_version(connection: Connection):
+    # The existing books become changes in id order, a client syncing from 0 receives all of them
+    connection.exec_driver_sql("ALTER TABLE books ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    connection.exec_driver_sql("UPDATE books SET version = id")
+
+
+@column_migration("books", "updated_at")
+def add_book_updated_at(connection: Connection):
+    connection.exec_driver_sql(
+        "ALTER TABLE books ADD COLUMN updated_at DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00'"
+    )
+    connection.exec_driver_sql("UPDATE books SET updated_at = CURRENT_TIMESTAMP")
+
+
+@column_migration("books", "content_hash")
+def add_book_content_hash(connection: Connection):
+    connection.exec_driver_sql("ALTER TABLE books ADD COLUMN content_hash VARCHAR NOT NULL DEFAULT ''")
+    # Plain SQL, the ORM table would also set updated_at, which may not have been added yet
+    books = connection.exec_driver_sql("SELECT id, title, author, publication_year FROM books").all()
+    if books:
+        connection.exec_driver_sql(
+            "UPDATE books SET content_hash = ? WHERE id = ?",
+            [(content_hash(title, author, year), book_id) for book_id, title, author, year in books],
+        )
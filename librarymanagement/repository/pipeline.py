@@ -0,0 +1,139 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from librarymanagement.repository.database import engine, lock_for_write
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WritePipeline:
+    """Coalesces concurrent write operations into group commits.
+
+    A single writer thread collects the operations submitted within ``max_batch_delay`` seconds (or until
+    ``max_batch_size`` operations are queued), applies them in one session and commits once. Every operation runs in
+    its own SAVEPOINT, so an operation that fails is rolled back and fails only its caller. Only when the batch itself
+    fails, e.g. on commit, every operation is retried in its own transaction.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = lambda: Session(engine)):
+        self.session_factory = session_factory
+        self.max_batch_size = 64
+        self.max_batch_delay = 0.005
+        self._queue = queue.Queue()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, max_batch_size: int = 64, max_batch_delay: float = 0.005):
+        if self.running:
+            return
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self._thread = threading.Thread(target=self._run, name="write-pipeline", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+        # Operations queued behind the stop marker are still committed so that no caller is left waiting
+        pending = []
+        while not self._queue.empty():
+            item = self._queue.get()
+            if item is not _STOP:
+                pending.append(item)
+        if pending:
+            self._commit_batch(pending)
+
+    def submit(self, operation: Callable, *args):
+        """Queue ``operation(db, *args)`` for the next group commit and wait for its result."""
+        future = Future()
+        self._queue.put((operation, args, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.max_batch_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit_batch(batch)
+            if stopping:
+                return
+
+    def _commit_batch(self, batch: list):
+        outcomes = []
+        with self.session_factory() as db:
+            try:
+                # pysqlite only emits BEGIN before DML, the savepoints need the transaction to be started explicitly
+                lock_for_write(db.connection())
+                for operation, args, _ in batch:
+                    outcomes.append(self._apply_in_savepoint(db, operation, args))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.info(f"Write batch of {len(batch)} failed, retrying operations individually, {e}")
+                for operation in batch:
+                    self._commit_one(*operation)
+                return
+
+        for (_, _, future), (result, error) in zip(batch, outcomes):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def _apply_in_savepoint(db: Session, operation: Callable, args: tuple) -> tuple:
+        pending_events = db.info.setdefault("pending_events", [])
+        staged = len(pending_events)
+        try:
+            with db.begin_nested():
+                return operation(db, *args), None
+        except Exception as e:
+            # The events of the rolled back operation must not be published with the batch
+            del pending_events[staged:]
+            return None, e
+
+    def _commit_one(self, operation: Callable, args: tuple, future: Future):
+        with self.session_factory() as db:
+            try:
+                result = operation(db, *args)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                future.set_exception(e)
+                return
+        future.set_result(result)
+
+
+write_pipeline = WritePipeline()
@@ -0,0 +1,280 @@
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain
+from operator import attrgetter
+from pathlib import Path
+from typing import Optional, List, Callable, Iterable, Iterator
+
+from sqlalchemy import create_engine, select, delete, update
+from sqlalchemy.orm import Session
+
+from librarymanagement.core.exeptions import InvalidBookIdException, DuplicateBookException
+from librarymanagement.core.settings import settings
+from librarymanagement.repository.crud import (
+    CONTENT_FIELDS,
+    chunks,
+    find_duplicate,
+    get_all_books,
+    get_book_by_id,
+    insert_book,
+    stage_insert_book,
+    stage_move_out_book,
+    stage_update_books,
+    stage_delete_books_by_ids,
+    delete_book_by_id,
+)
+from librarymanagement.repository.database import DirectoryBase, ensure_schema
+from librarymanagement.repository.models import BookShardORM
+from librarymanagement.service.schema import BookRow, NewBook, UpdateBook, BulkDeleteResponse
+
+
+def shard_for_genre(genre: str, shard_count: int) -> int:
+    # crc32 instead of hash(), which is salted per process
+    return zlib.crc32(genre.encode()) % shard_count
+
+
+class ShardedStorage:
+    """Books partitioned over ``shard_count`` SQLite files by a hash of their genre.
+
+    A directory database hands out the book ids, so they are unique over all shards, and maps every id to its shard.
+    All books of a genre live in one shard: the last-book-in-genre check stays local to one file, and writes to genres
+    in different shards do not wait for each other's write lock. Lists and searches run on all shards in parallel and
+    are merged by id.
+
+    Updates and bulk deletes spanning shards are staged on every shard under its write lock and only committed once
+    all shards succeeded. A genre change that moves a book is committed shard by shard after the other updates, not
+    atomically. Inserts and moves look for duplicates in all shards, other updates only in the shard of the book. Only
+    the shard a book is written to is checked again under its write lock. Change versions are allocated per shard, so
+    the change feed and the catalogue snapshot are only available on the single file storage.
+    """
+
+    def __init__(self, directory: str, shard_count: int):
+        self.directory = Path(directory)
+        self.shard_count = shard_count
+        self.directory_engine = self._create_engine("directory.db")
+        self.shard_engines = [self._create_engine(f"shard-{shard}.db") for shard in range(shard_count)]
+        self._executor = ThreadPoolExecutor(max_workers=shard_count, thread_name_prefix="shard")
+
+    def _create_engine(self, file_name: str):
+        return create_engine(f"sqlite:///{self.directory / file_name}", connect_args={"check_same_thread": False})
+
+    def ensure_schema(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        ensure_schema(self.directory_engine, DirectoryBase.metadata)
+        for engine in self.shard_engines:
+            ensure_schema(engine)
+
+    def shard_for_genre(self, genre: str) -> int:
+        return shard_for_genre(genre, self.shard_count)
+
+    def _on_shards(self, operation: Callable, shards: Optional[Iterable[int]] = None) -> list:
+        """Run ``operation(db, shard)`` with a session per shard, in parallel."""
+
+        def run(shard: int):
+            with Session(self.shard_engines[shard]) as db:
+                return operation(db, shard)
+
+        return list(self._executor.map(run, range(self.shard_count) if shards is None else shards))
+
+    @contextmanager
+    def _transaction_on_shards(self, shards: Iterable[int]) -> Iterator[dict[int, Session]]:
+        """Sessions on ``shards`` that are committed together when the block succeeds, all rolled back otherwise."""
+        sessions = {shard: Session(self.shard_engines[shard]) for shard in shards}
+        try:
+            yield sessions
+        except BaseException:
+            for db in sessions.values():
+                db.rollback()
+            raise
+        else:
+            for db in sessions.values():
+                db.commit()
+        finally:
+            for db in sessions.values():
+                db.close()
+
+    def _stage_on_shards(self, sessions: dict[int, Session], operation: Callable) -> list:
+        """Run ``operation(db, shard)`` on the sessions of ``_transaction_on_shards``, in parallel."""
+        return list(self._executor.map(lambda shard: operation(sessions[shard], shard), sessions))
+
+    def _shards_of(self, book_ids: list[int], strict: bool = True) -> dict[int, int]:
+        """Map ``book_ids`` to their shards, raising ``InvalidBookIdException`` for the first unknown id.
+
+        Without ``strict`` unknown ids are left out of the map instead.
+        """
+        book_shards = {}
+        with Session(self.directory_engine) as directory:
+            for chunk in chunks(book_ids):
+                book_shards.update(
+                    directory.execute(
+                        select(BookShardORM.id, BookShardORM.shard).where(BookShardORM.id.in_(chunk))
+                    ).all()
+                )
+        for book_id in book_ids:
+            if strict and book_id not in book_shards:
+                raise InvalidBookIdException(book_id)
+        return book_shards
+
+    def _forget(self, book_ids: list[int]):
+        with Session(self.directory_engine) as directory:
+            for chunk in chunks(book_ids):
+                directory.execute(delete(BookShardORM).where(BookShardORM.id.in_(chunk)))
+            directory.commit()
+
+    def get_all_books(
+        self,
+        author: Optional[str] = None,
+        title: Optional[str] = None,
+        excluded_genres=None,
+    ) -> List[BookRow]:
+        results = self._on_shards(
+            lambda db, shard: get_all_books(db, author=author, title=title, excluded_genres=excluded_genres)
+        )
+        return sorted(chain.from_iterable(results), key=attrgetter("id"))
+
+    def get_book_by_id(self, book_id: int) -> BookRow:
+        shard = self._shards_of([book_id])[book_id]
+        with Session(self.shard_engines[shard]) as db:
+            return get_book_by_id(db, book_id)
+
+    def insert_book(self, book: NewBook, on_duplicate: str = "allow") -> BookRow:
+        if on_duplicate != "allow":
+            duplicates = self._on_shards(
+                lambda db, shard: find_duplicate(db, book.title, book.author, book.publication_year)
+            )
+            duplicate = min(filter(None, duplicates), key=attrgetter("id"), default=None)
+            if duplicate and on_duplicate == "reject":
+                raise DuplicateBookException(duplicate.id)
+            if duplicate:
+                return duplicate
+
+        shard = self.shard_for_genre(book.genre)
+        with Session(self.directory_engine) as directory:
+            book_shard = BookShardORM(shard=shard)
+            directory.add(book_shard)
+            directory.flush()
+            book_id = book_shard.id
+            directory.commit()
+
+        try:
+            with Session(self.shard_engines[shard]) as db:
+                # Checked again under the write lock of the shard, against a concurrent insert of the same book
+                inserted_book = insert_book(db, book, on_duplicate, book_id=book_id)
+        except BaseException:
+            self._forget([book_id])
+            raise
+        if inserted_book.id != book_id:
+            self._forget([book_id])
+        return inserted_book
+
+    def update_books(self, books: list[UpdateBook], on_duplicate: str = "allow") -> list[BookRow]:
+        book_shards = self._shards_of([book.id for book in books])
+
+        in_place, moves = defaultdict(list), []
+        for book in books:
+            if book.genre is not None and self.shard_for_genre(book.genre) != book_shards[book.id]:
+                moves.append(book)
+            else:
+                in_place[book_shards[book.id]].append(book)
+
+        # Moves are committed after the other updates, so their duplicates are looked for before anything is written
+        prepared_moves = [self._prepare_move(book, book_shards[book.id], on_duplicate) for book in moves]
+
+        updated_books = {}
+        with self._transaction_on_shards(in_place) as sessions:
+            results = self._stage_on_shards(
+                sessions, lambda db, shard: stage_update_books(db, in_place[shard], on_duplicate)
+            )
+        for rows in results:
+            updated_books.update((row.id, row) for row in rows)
+        for book, (moved_book, check_duplicates) in zip(moves, prepared_moves):
+            updated_books[book.id] = self._move_book(moved_book, book_shards[book.id], check_duplicates)
+            book_shards[book.id] = self.shard_for_genre(book.genre)
+        return [updated_books[book.id] for book in books]
+
+    def _prepare_move(self, book: UpdateBook, source: int, on_duplicate: str) -> tuple[BookRow, bool]:
+        """The moved book, and whether its new content must not duplicate another book.
+
+        As for other updates, a move that turns a book into a duplicate is rejected, also with ``return_existing``.
+        The shards other than the target are checked here, the target is checked under its write lock by the insert.
+        """
+        changes = book.model_dump(exclude={"id"}, exclude_none=True)
+        with Session(self.shard_engines[source]) as source_db:
+            moved_book = get_book_by_id(source_db, book.id)._replace(**changes)
+
+        check_duplicates = on_duplicate != "allow" and bool(CONTENT_FIELDS & changes.keys())
+        if check_duplicates:
+            target = self.shard_for_genre(moved_book.genre)
+            duplicates = self._on_shards(
+                lambda db, shard: find_duplicate(
+                    db, moved_book.title, moved_book.author, moved_book.publication_year, exclude_id=book.id
+                ),
+                [shard for shard in range(self.shard_count) if shard != target],
+            )
+            duplicate = min(filter(None, duplicates), key=attrgetter("id"), default=None)
+            if duplicate:
+                raise DuplicateBookException(duplicate.id)
+        return moved_book, check_duplicates
+
+    def _move_book(self, moved_book: BookRow, source: int, check_duplicates: bool) -> BookRow:
+        """Move a book to the shard of its new genre: insert into the target, repoint the directory, then delete."""
+        target = self.shard_for_genre(moved_book.genre)
+        with Session(self.shard_engines[target]) as target_db:
+            # The book keeps its id, its event is an update
+            try:
+                stage_insert_book(
+                    target_db,
+                    NewBook(**moved_book._asdict()),
+                    "reject" if check_duplicates else "allow",
+                    moved_book.id,
+                    event_type="updated",
+                )
+            except DuplicateBookException:
+                target_db.rollback()
+                raise
+            target_db.commit()
+
+        with Session(self.directory_engine) as directory:
+            directory.execute(update(BookShardORM).where(BookShardORM.id == moved_book.id).values(shard=target))
+            directory.commit()
+
+        with Session(self.shard_engines[source]) as source_db:
+            stage_move_out_book(source_db, moved_book.id)
+            source_db.commit()
+
+        return moved_book
+
+    def delete_book_by_id(self, book_id: int):
+        shard = self._shards_of([book_id])[book_id]
+        with Session(self.shard_engines[shard]) as db:
+            delete_book_by_id(db, book_id)
+        self._forget([book_id])
+
+    def delete_books_by_ids(self, book_ids: list[int]) -> BulkDeleteResponse:
+        book_ids = list(dict.fromkeys(book_ids))
+        book_shards = self._shards_of(book_ids, strict=False)
+
+        ids_by_shard = defaultdict(list)
+        for book_id, shard in book_shards.items():
+            ids_by_shard[shard].append(book_id)
+        with self._transaction_on_shards(ids_by_shard) as sessions:
+            results = self._stage_on_shards(
+                sessions, lambda db, shard: stage_delete_books_by_ids(db, ids_by_shard[shard])
+            )
+
+        deleted = set(chain.from_iterable(result.deleted for result in results))
+        skipped = set(chain.from_iterable(result.skipped for result in results))
+        # Ids the directory still maps to a shard that no longer has the book are forgotten as well
+        self._forget(list(deleted.union(*(result.not_found for result in results))))
+        return BulkDeleteResponse(
+            deleted=[book_id for book_id in book_ids if book_id in deleted],
+            skipped=[book_id for book_id in book_ids if book_id in skipped],
+            not_found=[book_id for book_id in book_ids if book_id not in deleted and book_id not in skipped],
+        )
+
+
+sharded_storage = (
+    ShardedStorage(settings.storage_shard_dir, settings.storage_shards) if settings.storage_shards else None
+)
@@ -0,0 +1,234 @@
+import sys
+import threading
+from array import array
+from functools import reduce
+from itertools import compress, repeat
+from operator import and_, or_
+from typing import Optional, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from librarymanagement.core.settings import settings
+from librarymanagement.repository.crud import get_book_changes, get_data_version
+from librarymanagement.repository.models import BookORM
+from librarymanagement.service.events import event_bus
+from librarymanagement.service.schema import Book, BookEvent, BookRow
+
+SYNC_PAGE_SIZE = 1000
+
+
+class CatalogueSnapshot:
+    """Columnar in-memory copy of the books table for read-heavy filtering.
+
+    Ids, publication years and dictionary encoded genres are kept in ``array`` columns, titles and authors in
+    interned string lists with a case-folded copy for matching. Filters are evaluated column by column into masks.
+    SQLite stays the source of truth: the snapshot is loaded on first use and then kept current by the committed
+    write events of this process. Deleted rows are only marked and compacted away once they make up a quarter of the
+    columns.
+
+    Writes by other worker processes are picked up lazily: every read compares the data version of the database with
+    the version the snapshot was last synchronised to, and replays the changes in between through
+    ``crud.get_book_changes``, or reloads when there are too many.
+
+    Author and title matching is a case-insensitive substring match, ``%`` and ``_`` are not treated as wildcards like
+    the ``ILIKE`` filter of ``crud.get_all_books`` does.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.version = 0
+        self._clear()
+
+    def _clear(self):
+        self._ids = array("q")
+        self._years = array("q")
+        self._genre_codes = array("l")
+        self._titles = []
+        self._authors = []
+        self._folded_titles = []
+        self._folded_authors = []
+        self._alive = bytearray()
+        self._positions = {}
+        self._genres = []
+        self._genre_code_by_name = {}
+        self._dead = 0
+        self._ordered = True
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def load(self, db: Session):
+        with self._lock:
+            self._clear()
+            # Read before the rows, so changes committed during the load are replayed by the next sync
+            self.version = get_data_version(db)
+            query = select(
+                BookORM.id,
+                BookORM.title,
+                BookORM.author,
+                BookORM.publication_year,
+                BookORM.genre,
+            ).order_by(BookORM.id)
+            for row in db.execute(query.execution_options(yield_per=1000)):
+                self._append(*row)
+            self.loaded = True
+
+    def _genre_code(self, genre: str) -> int:
+        code = self._genre_code_by_name.get(genre)
+        if code is None:
+            code = self._genre_code_by_name[genre] = len(self._genres)
+            self._genres.append(sys.intern(genre))
+        return code
+
+    def _append(self, book_id: int, title: str, author: str, publication_year: int, genre: str):
+        if self._ids and book_id < self._ids[-1]:
+            self._ordered = False
+        self._positions[book_id] = len(self._ids)
+        self._ids.append(book_id)
+        self._years.append(publication_year)
+        self._genre_codes.append(self._genre_code(genre))
+        self._titles.append(sys.intern(title))
+        self._authors.append(sys.intern(author))
+        self._folded_titles.append(sys.intern(title.casefold()))
+        self._folded_authors.append(sys.intern(author.casefold()))
+        self._alive.append(1)
+
+    def _upsert(self, book: Book):
+        position = self._positions.get(book.id)
+        if position is None:
+            self._append(book.id, book.title, book.author, book.publication_year, book.genre)
+            return
+        self._years[position] = book.publication_year
+        self._genre_codes[position] = self._genre_code(book.genre)
+        self._titles[position] = sys.intern(book.title)
+        self._authors[position] = sys.intern(book.author)
+        self._folded_titles[position] = sys.intern(book.title.casefold())
+        self._folded_authors[position] = sys.intern(book.author.casefold())
+
+    def _remove(self, book_id: int):
+        position = self._positions.pop(book_id, None)
+        if position is None:
+            return
+        self._alive[position] = 0
+        self._dead += 1
+        if self._dead * 4 > len(self._ids):
+            self._compact()
+
+    def _compact(self):
+        order = [position for position in range(len(self._ids)) if self._alive[position]]
+        if not self._ordered:
+            order.sort(key=self._ids.__getitem__)
+        ids, years, genre_codes = self._ids, self._years, self._genre_codes
+        titles, authors, folded_titles, folded_authors = (
+            self._titles,
+            self._authors,
+            self._folded_titles,
+            self._folded_authors,
+        )
+
+        self._ids = array("q", (ids[position] for position in order))
+        self._years = array("q", (years[position] for position in order))
+        self._genre_codes = array("l", (genre_codes[position] for position in order))
+        self._titles = [titles[position] for position in order]
+        self._authors = [authors[position] for position in order]
+        self._folded_titles = [folded_titles[position] for position in order]
+        self._folded_authors = [folded_authors[position] for position in order]
+        self._alive = bytearray(b"\x01" * len(order))
+        self._positions = {book_id: position for position, book_id in enumerate(self._ids)}
+        self._dead = 0
+        self._ordered = True
+
+    def sync(self, db: Session):
+        """Load on first use, afterwards replay the changes committed since the last sync by any process."""
+        with self._lock:
+            if not self.loaded:
+                self.load(db)
+                return
+            if not settings.snapshot_coherence_check:
+                return
+
+            version = get_data_version(db)
+            if version == self.version:
+                return
+            if version < self.version:
+                # The database was replaced
+                self.load(db)
+                return
+
+            max_changes = max(settings.snapshot_max_replay, len(self) // 2)
+            replayed = 0
+            since = self.version
+            while True:
+                changes = get_book_changes(db, since=since, limit=SYNC_PAGE_SIZE)
+                replayed += len(changes.changes)
+                if replayed > max_changes:
+                    self.load(db)
+                    return
+                for change in changes.changes:
+                    if change.deleted:
+                        self._remove(change.id)
+                    else:
+                        self._upsert(change.book)
+                since = changes.next_token
+                if not changes.has_more:
+                    break
+            self.version = since
+
+    def apply(self, event: BookEvent):
+        """Apply a committed write, registered as an event bus listener."""
+        with self._lock:
+            if not self.loaded:
+                return
+            if event.type == "deleted":
+                self._remove(event.book_id)
+            else:
+                self._upsert(event.book)
+            # The next change of this worker, the next sync does not have to replay it. After a gap the sync replays
+            # the versions in between, writes of other workers, and this event again.
+            if event.id == self.version + 1:
+                self.version = event.id
+
+    def get_all_books(
+        self,
+        db: Session,
+        author: Optional[str] = None,
+        title: Optional[str] = None,
+        excluded_genres=None,
+    ) -> List[BookRow]:
+        """Same filters as ``crud.get_all_books``, the session is only used to synchronise the snapshot."""
+        with self._lock:
+            self.sync(db)
+
+            masks = [self._alive]
+            if author or title:
+                author_mask = (
+                    map(str.__contains__, self._folded_authors, repeat(author.casefold())) if author else repeat(False)
+                )
+                title_mask = (
+                    map(str.__contains__, self._folded_titles, repeat(title.casefold())) if title else repeat(False)
+                )
+                masks.append(map(or_, author_mask, title_mask))
+            if excluded_genres:
+                included = [genre not in excluded_genres for genre in self._genres]
+                masks.append(map(included.__getitem__, self._genre_codes))
+
+            positions = list(compress(range(len(self._ids)), reduce(lambda left, right: map(and_, left, right), masks)))
+            if not self._ordered:
+                positions.sort(key=self._ids.__getitem__)
+
+            return [
+                BookRow(
+                    self._ids[position],
+                    self._titles[position],
+                    self._authors[position],
+                    self._years[position],
+                    self._genres[self._genre_codes[position]],
+                )
+                for position in positions
+            ]
+
+
+catalogue_snapshot = CatalogueSnapshot()
+event_bus.add_listener(catalogue_snapshot.apply)
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+from collections import deque
+from operator import attrgetter
+from typing import Optional, Callable
+
+from librarymanagement.core.settings import settings
+from librarymanagement.service.books import mask_title
+from librarymanagement.service.schema import BookEvent
+
+
+class Subscription:
+    """A subscriber's bounded event queue, filled from any thread and drained on the subscriber's event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_size: int):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self.lagged = False
+        self.check_gaps = False
+        # Version of the last queued event, ``None`` until the first one when the bus did not know the current version
+        self.last_event_id: Optional[int] = None
+
+    def offer(self, event: BookEvent):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The subscriber's event loop is closed
+            self.lagged = True
+
+    def _put(self, event: Optional[BookEvent]):
+        if self.lagged:
+            return
+        if self.check_gaps:
+            # A skipped version was written by another worker process or is published out of order, either way the
+            # subscriber would miss it
+            if self.last_event_id is not None and event.id != self.last_event_id + 1:
+                self.mark_lagged()
+                return
+            self.last_event_id = event.id
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.mark_lagged()
+
+    def mark_lagged(self):
+        # Drop everything that is queued, the subscriber has to resync through GET /books/changes
+        self.lagged = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self, timeout: float) -> Optional[BookEvent]:
+        """Next event, ``None`` once the subscriber has to resync. Raises ``TimeoutError`` when idle."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventBus:
+    """In-process publish/subscribe bus for book mutations with a bounded replay buffer.
+
+    Events are identified by the change version of the write, which the database hands out to every worker process,
+    so a ``Last-Event-ID`` means the same change in any process and after restarts. The bus starts at the version
+    passed to ``start_at``, or at the first published event.
+    """
+
+    def __init__(self, replay_size: int = 1000, subscriber_queue_size: int = 100):
+        self.subscriber_queue_size = subscriber_queue_size
+        self._lock = threading.Lock()
+        self._last_event_id: Optional[int] = None
+        self._replay = deque(maxlen=replay_size)
+        self._subscribers = set()
+        self._listeners = []
+
+    def add_listener(self, listener: Callable[[BookEvent], None]):
+        """Call ``listener`` synchronously, in the committing thread, for every published event."""
+        self._listeners.append(listener)
+
+    def start_at(self, version: int):
+        """Set the version of the latest change in the database, the next event is expected to have the one after."""
+        with self._lock:
+            self._last_event_id = max(self._last_event_id or 0, version)
+
+    def publish(self, event_type: str, book_id: int, version: int, book=None):
+        with self._lock:
+            self._last_event_id = max(self._last_event_id or 0, version)
+            event = BookEvent(id=version, type=event_type, book_id=book_id, book=book)
+            self._replay.append(event)
+            subscribers = list(self._subscribers)
+
+        for listener in self._listeners:
+            listener(event)
+        for subscription in subscribers:
+            subscription.offer(event)
+
+    def subscribe(self, last_event_id: Optional[int] = None, check_gaps: bool = True) -> Subscription:
+        """Subscribe from the running event loop, replaying the events after ``last_event_id`` when given.
+
+        The subscriber has to resync unless the replay buffer holds every version after ``last_event_id``, and with
+        ``check_gaps`` also as soon as a later event skips a version. Versions are missing when they were written by
+        another worker process, before a restart or were already evicted.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), self.subscriber_queue_size)
+        with self._lock:
+            if last_event_id is not None and self._last_event_id is None:
+                # Nothing is known about the changes since the start of this process
+                subscription.mark_lagged()
+            elif last_event_id is not None:
+                # Commits are serialised by the write lock, but published by each committing thread
+                missed = sorted((event for event in self._replay if event.id > last_event_id), key=attrgetter("id"))
+                complete = [event.id for event in missed] == list(range(last_event_id + 1, self._last_event_id + 1))
+                if (
+                    not complete
+                    or last_event_id > self._last_event_id
+                    or len(missed) >= self.subscriber_queue_size
+                ):
+                    subscription.mark_lagged()
+                else:
+                    for event in missed:
+                        subscription.queue.put_nowait(event)
+            subscription.check_gaps = check_gaps
+            subscription.last_event_id = self._last_event_id
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+async def stream_events(bus: EventBus, subscription: Subscription, keep_alive: float = 15):
+    """Format a subscription as a Server-Sent Events stream, ending with a ``resync`` event when it lagged."""
+    try:
+        while True:
+            try:
+                event = await subscription.get(keep_alive)
+            except TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            if event.book:
+                event = event.model_copy(update={"book": mask_title(event.book)})
+            yield f"id: {event.id}\nevent: {event.type}\ndata: {event.model_dump_json()}\n\n"
+    finally:
+        bus.unsubscribe(subscription)
+
+
+event_bus = EventBus(
+    replay_size=settings.event_replay_size,
+    subscriber_queue_size=settings.event_subscriber_queue_size,
+)
@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import Optional, Literal, NamedTuple
 
-from pydantic import BaseModel, computed_field
+from pydantic import BaseModel, ConfigDict, computed_field
 
 
 class NewBook(BaseModel):
@@ -11,6 +11,18 @@ class NewBook(BaseModel):
 
 
 class Book(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    author: str
+    publication_year: int
+    genre: str
+
+
+class BookRow(NamedTuple):
+    """Compact book used on the read paths, only converted to a ``Book`` at the API edge."""
+
     id: int
     title: str
     author: str
@@ -37,3 +49,45 @@ class BookGenre(BaseModel):
 
 class BookListResponse(BaseModel):
     genres: dict[str, BookGenre]
+
+
+class BulkDeleteResponse(BaseModel):
+    deleted: list[int]
+    skipped: list[int]
+    not_found: list[int] = []
+
+
+class BookChange(BaseModel):
+    version: int
+    id: int
+    deleted: bool = False
+    book: Optional[Book] = None
+
+
+class BookChangesResponse(BaseModel):
+    changes: list[BookChange]
+    next_token: int
+    has_more: bool
+
+
+class BookEvent(BaseModel):
+    id: int
+    type: Literal["created", "updated", "deleted"]
+    book_id: int
+    book: Optional[Book] = None
+
+
+class PolicyResponse(BaseModel):
+    version: int
+    disabled_genres_create: list[str]
+    disabled_genres_search: list[str]
+    masked_genres: list[str]
+
+
+class AdmissionStats(BaseModel):
+    active: int
+    waiting: int
+    admitted: int
+    rejected: int
+    max_concurrency: int
+    max_queue: int
@@ -0,0 +1,41 @@
+"""Report the books that share a content hash, without loading the catalogue.
+
+Usage: python scripts/dedupe_report.py [--database PATH]
+
+Streams the content hash index of the books table in hash order and prints one CSV row per book of every group with
+more than one book. Groups are read one at a time, so run it against a copy of the database for a consistent report.
+"""
+
+import argparse
+import csv
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="library.db", help="SQLite database to report on")
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from librarymanagement.repository.crud import iter_duplicate_groups
+
+    engine = create_engine(f"sqlite:///{args.database}")
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["group", "id", "title", "author", "publication_year", "genre"])
+    groups = books = 0
+    with Session(engine) as db:
+        for groups, group in enumerate(iter_duplicate_groups(db), start=1):
+            books += len(group)
+            for book in group:
+                writer.writerow([groups, *book])
+    print(f"{groups} groups of duplicates, {books} books", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Measure the memory used by a full-catalogue GET /books request.
+
+Usage: python scripts/memory_benchmark.py [--books N]
+
+Fills a temporary database with N books, then serves one unfiltered GET /books/ per mode in a fresh interpreter:
+
+* ``rows``: the current read path, ``BookRow`` tuples that only become ``Book`` models at the API edge.
+* ``orm``: the previous read path, ``BookORM`` entities validated into ``Book`` models and masked in place.
+
+For each mode the peak of traced Python allocations and the growth of the peak RSS during the request are printed.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MASKED_TITLE = "*" * 10
+
+
+def fill_database(path: str, books: int):
+    from sqlalchemy import create_engine, insert
+
+    from librarymanagement.repository.database import ensure_schema
+    from librarymanagement.repository.models import BookORM, content_hash
+
+    engine = create_engine(f"sqlite:///{path}")
+    ensure_schema(engine)
+    now = datetime.now()
+    rows = []
+    for book_id in range(1, books + 1):
+        title, author, publication_year = f"Title of book {book_id}", f"Author {book_id % 5000}", 1900 + book_id % 120
+        rows.append(
+            {
+                "id": book_id,
+                "title": title,
+                "author": author,
+                "publication_year": publication_year,
+                "genre": f"Genre {book_id % 30}",
+                "version": book_id,
+                "content_hash": content_hash(title, author, publication_year),
+                "updated_at": now,
+            }
+        )
+    with engine.begin() as connection:
+        connection.execute(insert(BookORM.__table__), rows)
+
+
+def orm_get_all_books(db, author=None, title=None, excluded_genres=None):
+    from sqlalchemy import select
+
+    from librarymanagement.repository.models import BookORM
+    from librarymanagement.service.schema import Book
+
+    return [Book.model_validate(row, from_attributes=True) for row in db.execute(select(BookORM)).scalars().all()]
+
+
+def orm_mask_titles(books):
+    from librarymanagement.core.policy import current_policy
+
+    masked_genres = current_policy().masked_genres
+    for book in books:
+        if book.genre in masked_genres:
+            book.title = MASKED_TITLE
+    return books
+
+
+def measure(path: str, mode: str):
+    import resource
+    import tracemalloc
+    from unittest.mock import patch
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from starlette.testclient import TestClient
+
+    from librarymanagement.core.policy import policy_store
+    from librarymanagement.core.settings import settings
+    from librarymanagement.main import app
+    from librarymanagement.repository.database import get_session
+
+    engine = create_engine(f"sqlite:///{path}")
+    policy_store.policy = policy_store.policy._replace(masked_genres=frozenset({"Genre 1"}))
+    settings.admission_list_max_concurrency = 1
+
+    def override_get_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    client = TestClient(app)
+
+    patches = []
+    if mode == "orm":
+        patches = [
+            patch("librarymanagement.controller.librarymanager.get_all_books", orm_get_all_books),
+            patch("librarymanagement.controller.librarymanager.mask_titles", orm_mask_titles),
+        ]
+    for active_patch in patches:
+        active_patch.start()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    response = client.get("/books/")
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    assert response.status_code == 200
+    print(f"{len(response.json())} {traced_peak} {rss_growth * 1024}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=100_000, help="Number of books in the catalogue")
+    parser.add_argument("--measure", nargs=2, metavar=("DATABASE", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "library.db")
+        fill_database(path, args.books)
+        for mode in ("orm", "rows"):
+            result = subprocess.run(
+                [sys.executable, __file__, "--measure", path, mode],
+                cwd=directory,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            books, traced_peak, rss_growth = map(int, result.stdout.split()[-3:])
+            print(
+                f"{mode:>4}: {books} books, traced peak {traced_peak / 2**20:7.1f} MiB, "
+                f"peak RSS growth {rss_growth / 2**20:7.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Measure how long a worker takes to import the app and get through its startup.
+
+Usage: python scripts/startup_budget.py [--budget SECONDS] [--top N]
+
+Runs in a fresh temporary directory, so the first boot runs the schema DDL and the restart shows the
+skip-if-current path. Exits with status 1 when a boot exceeds the budget.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+BOOT = """
+import asyncio, time
+start = time.perf_counter()
+from librarymanagement.main import app, lifespan
+imported = time.perf_counter()
+
+async def boot():
+    async with lifespan(app):
+        print(f"{imported - start:.4f} {time.perf_counter() - start:.4f}")
+
+asyncio.run(boot())
+"""
+
+
+def run_python(args: list[str], cwd: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+
+def import_times(cwd: str) -> dict[str, int]:
+    """Cumulative import time in microseconds per module, from ``python -X importtime``."""
+    result = run_python(["-X", "importtime", "-c", "import librarymanagement.main"], cwd)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative)
+    return times
+
+
+def boot(cwd: str) -> tuple[float, float]:
+    output = run_python(["-c", BOOT], cwd).stdout.split()
+    return float(output[-2]), float(output[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=1.0, help="Maximum seconds until the worker is ready")
+    parser.add_argument("--top", type=int, default=10, help="Number of top level packages to show")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cwd:
+        times = import_times(cwd)
+        packages = defaultdict(int)
+        for module, cumulative in times.items():
+            if "." not in module:
+                packages[module] += cumulative
+
+        print("Import time per top level package:")
+        for package, cumulative in sorted(packages.items(), key=lambda item: item[1], reverse=True)[: args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {package}")
+        print("Import time of the application modules:")
+        for module, cumulative in times.items():
+            if module.startswith("librarymanagement."):
+                print(f"  {cumulative / 1000:8.1f} ms  {module}")
+
+        exceeded = False
+        for label in ("First boot", "Restart"):
+            imported, ready = boot(cwd)
+            exceeded |= ready > args.budget
+            print(f"{label}: imported in {imported * 1000:.1f} ms, ready in {ready * 1000:.1f} ms")
+
+    if exceeded:
+        print(f"Startup budget of {args.budget * 1000:.0f} ms exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import re
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
+import pytest
+from sqlalchemy import create_engine, event, insert, Engine
+from sqlalchemy.orm import sessionmaker
+
+from librarymanagement.core.policy import policy_store
+from librarymanagement.repository.database import ensure_schema
+from librarymanagement.repository.models import BookORM, content_hash
+
+# A plan step that reads a whole table instead of searching an index, "SCAN TABLE books" before SQLite 3.36
+FULL_SCAN = re.compile(r"SCAN (TABLE )?(\w+)$")
+WHERE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+
+BOOK_COUNT = 1000
+
+options = {}
+slow_tests = []
+full_scans = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("query budgets")
+    group.addoption(
+        "--slow-test-seconds",
+        type=float,
+        default=0.5,
+        help="Report tests whose call phase takes at least this long",
+    )
+    group.addoption(
+        "--query-plans",
+        action="store_true",
+        help="Report the full table scans of filtered statements run through the query_counter fixture",
+    )
+
+
+def pytest_configure(config):
+    options["slow_test_seconds"] = config.getoption("--slow-test-seconds")
+
+
+def pytest_runtest_logreport(report):
+    if report.when == "call" and report.duration >= options["slow_test_seconds"]:
+        slow_tests.append((report.duration, report.nodeid))
+
+
+def pytest_terminal_summary(terminalreporter):
+    if slow_tests:
+        terminalreporter.section("slow tests")
+        for duration, nodeid in sorted(slow_tests, reverse=True):
+            terminalreporter.write_line(f"{duration:.2f}s {nodeid}")
+    if full_scans:
+        terminalreporter.section("full table scans")
+        for (statement, step), nodeids in full_scans.items():
+            terminalreporter.write_line(f"{step} in {len(nodeids)} test(s), e.g. {nodeids[0]}")
+            terminalreporter.write_line(f"    {' '.join(statement.split())}")
+
+
+class Query(NamedTuple):
+    statement: str
+    parameters: object
+    executemany: bool
+    rows_written: int
+
+
+class QueryCounter:
+    """Records the statements executed on an engine and the rows they write, to assert query budgets."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.queries: list[Query] = []
+        self.all_queries: list[Query] = []
+        event.listen(engine, "after_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        # pysqlite reports -1 for SELECT, the total of all parameter sets for executemany
+        query = Query(statement, parameters, executemany, max(cursor.rowcount, 0))
+        self.queries.append(query)
+        self.all_queries.append(query)
+
+    def close(self):
+        event.remove(self.engine, "after_cursor_execute", self._record)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def rows_written(self) -> int:
+        return sum(query.rows_written for query in self.queries)
+
+    @contextmanager
+    def measure(self):
+        """Only count the statements executed inside the block."""
+        self.queries = []
+        yield self
+
+    def assert_budget(self, queries: int, rows_written: Optional[int] = None):
+        statements = "\n".join(" ".join(query.statement.split()) for query in self.queries)
+        assert self.count <= queries, f"{self.count} queries, budget {queries}:\n{statements}"
+        if rows_written is not None:
+            assert self.rows_written <= rows_written, f"{self.rows_written} rows written, budget {rows_written}"
+
+    def full_scans(self, queries: Optional[list[Query]] = None, filtered_only: bool = False) -> list[tuple[str, str]]:
+        """The statements whose ``EXPLAIN QUERY PLAN`` reads a whole table, with the scanning step."""
+        scans = []
+        # A raw DBAPI connection, so the EXPLAIN statements are not recorded themselves
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for query in self.queries if queries is None else queries:
+                if filtered_only and not WHERE.search(query.statement):
+                    continue
+                parameters = query.parameters[0] if query.executemany else query.parameters
+                for *_, step in cursor.execute(f"EXPLAIN QUERY PLAN {query.statement}", parameters).fetchall():
+                    if FULL_SCAN.match(step):
+                        scans.append((query.statement, step))
+        finally:
+            connection.close()
+        return scans
+
+    def assert_no_full_scans(self):
+        scans = self.full_scans()
+        assert not scans, "Full table scans:\n" + "\n".join(f"{step}: {' '.join(sql.split())}" for sql, step in scans)
+
+
+@pytest.fixture
+def set_policy(monkeypatch):
+    """Replace genre rules of the current policy until the end of the test, as a settings reload would."""
+
+    def set_policy(**genres):
+        policy = policy_store.policy._replace(**{rule: frozenset(genres) for rule, genres in genres.items()})
+        monkeypatch.setattr(policy_store, "policy", policy)
+
+    return set_policy
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """A real SQLite database file with the current schema."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}", connect_args={"check_same_thread": False})
+    ensure_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db_session(db_engine):
+    with sessionmaker(bind=db_engine)() as session:
+        yield session
+
+
+@pytest.fixture
+def books(db_session):
+    """``BOOK_COUNT`` books spread over ten genres, inserted without going through the crud functions."""
+    db_session.execute(
+        insert(BookORM.__table__),
+        [
+            {
+                "id": book_id,
+                "title": f"Book {book_id}",
+                "author": f"Author {book_id % 100}",
+                "publication_year": 2000 + book_id % 25,
+                "genre": f"Genre {book_id % 10}",
+                "version": book_id,
+                "content_hash": content_hash(f"Book {book_id}", f"Author {book_id % 100}", 2000 + book_id % 25),
+            }
+            for book_id in range(1, BOOK_COUNT + 1)
+        ],
+    )
+    db_session.commit()
+
+
+@pytest.fixture
+def query_counter(db_engine, request):
+    counter = QueryCounter(db_engine)
+    yield counter
+    if request.config.getoption("--query-plans"):
+        for scan in counter.full_scans(counter.all_queries, filtered_only=True):
+            full_scans.setdefault(scan, []).append(request.node.nodeid)
+    counter.close()
@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+import pytest
+from starlette.testclient import TestClient
+
+from librarymanagement.core.admission import AdmissionController
+from librarymanagement.core.settings import settings
+from librarymanagement.main import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "token")
+    return TestClient(app, headers={"X-Admin-Token": "token"})
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "other"}])
+def test_admin_routes_require_token(monkeypatch, headers):
+    monkeypatch.setattr(settings, "admin_token", "token")
+    client = TestClient(app, headers=headers)
+
+    assert client.get("/admin/profiles").status_code == 401
+    assert client.post("/admin/settings/reload").status_code == 401
+
+
+def test_admin_routes_disabled_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", None)
+
+    assert TestClient(app, headers={"X-Admin-Token": ""}).get("/admin/admission").status_code == 403
+
+
+def test_get_admission_stats(client):
+    controller = AdmissionController("list", max_concurrency=4, max_queue=16)
+    controller.rejected = 3
+
+    with patch.dict("librarymanagement.controller.admin.admission_controllers", {"list": controller}, clear=True):
+        response = client.get("/admin/admission")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "list": {
+                "active": 0,
+                "waiting": 0,
+                "admitted": 0,
+                "rejected": 3,
+                "max_concurrency": 4,
+                "max_queue": 16,
+            }
+        }
+
+
+def test_reload_settings(client, monkeypatch, set_policy):
+    set_policy(masked_genres=["18+"])
+    monkeypatch.setenv("MASKED_GENRES", '["Genre 1"]')
+
+    response = client.post("/admin/settings/reload")
+
+    assert response.status_code == 200
+    assert response.json()["masked_genres"] == ["Genre 1"]
+    assert client.get("/admin/settings/policy").json() == response.json()
+
+
+def test_reload_invalid_settings(client, monkeypatch, set_policy):
+    set_policy(masked_genres=["18+"])
+    monkeypatch.setenv("MASKED_GENRES", "not a list")
+
+    response = client.post("/admin/settings/reload")
+
+    assert response.status_code == 400
+    assert client.get("/admin/settings/policy").json()["masked_genres"] == ["18+"]
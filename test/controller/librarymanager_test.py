@@ -3,7 +3,12 @@ from unittest.mock import patch, MagicMock, ANY
 import pytest
 from starlette.testclient import TestClient
 
-from librarymanagement.core.exeptions import InvalidBookIdException, LastBookGenreDeleteException
+from librarymanagement.core.admission import AdmissionController
+from librarymanagement.core.exeptions import (
+    InvalidBookIdException,
+    LastBookGenreDeleteException,
+    DuplicateBookException,
+)
 from librarymanagement.core.settings import settings
 from librarymanagement.main import app
 from librarymanagement.repository.database import get_session
@@ -13,6 +18,10 @@ from librarymanagement.service.schema import (
     UpdateBook,
     BookListResponse,
     BookGenre,
+    BulkDeleteResponse,
+    BookChange,
+    BookChangesResponse,
+    BookRow,
 )
 
 
@@ -49,8 +58,8 @@ def test_get_books(client):
             mock_mask_titles.assert_called_once_with(TEST_BOOKS)
 
 
-def test_get_books_with_filter(client):
-    settings.disabled_genres_search = ["Genre 1"]
+def test_get_books_with_filter(client, set_policy):
+    set_policy(disabled_genres_search=["Genre 1"])
 
     with patch(
         "librarymanagement.controller.librarymanager.get_all_books",
@@ -64,13 +73,13 @@ def test_get_books_with_filter(client):
             assert response.status_code == 200
             assert response.json() == [book.model_dump() for book in TEST_BOOKS]
             mock_get_all_books.assert_called_once_with(
-                ANY, title="Book 1", author="Author 1", excluded_genres=["Genre 1"]
+                ANY, title="Book 1", author="Author 1", excluded_genres=frozenset({"Genre 1"})
             )
             mock_mask_titles.assert_called_once_with(TEST_BOOKS)
 
 
-def test_create_book(client):
-    settings.disabled_genres_create = ["Genre 2"]
+def test_create_book(client, set_policy):
+    set_policy(disabled_genres_create=["Genre 2"])
 
     with patch(
         "librarymanagement.controller.librarymanager.insert_book",
@@ -80,11 +89,13 @@ def test_create_book(client):
 
         assert response.status_code == 200
         assert response.json() == TEST_BOOKS[0].model_dump()
-        mock_create_book.assert_called_once_with(ANY, NewBook.model_validate(TEST_BOOKS[0], from_attributes=True))
+        mock_create_book.assert_called_once_with(
+            ANY, NewBook.model_validate(TEST_BOOKS[0], from_attributes=True), settings.duplicate_books
+        )
 
 
-def test_create_book_disabled_genre(client):
-    settings.disabled_genres_create = ["Genre 1"]
+def test_create_book_disabled_genre(client, set_policy):
+    set_policy(disabled_genres_create=["Genre 1"])
 
     with patch(
         "librarymanagement.controller.librarymanager.insert_book",
@@ -97,8 +108,8 @@ def test_create_book_disabled_genre(client):
         mock_create_book.assert_not_called()
 
 
-def test_update_book(client):
-    settings.disabled_genres_create = ["Genre 2"]
+def test_update_book(client, set_policy):
+    set_policy(disabled_genres_create=["Genre 2"])
 
     with patch(
         "librarymanagement.controller.librarymanager.update_books",
@@ -108,11 +119,35 @@ def test_update_book(client):
 
         assert response.status_code == 200
         assert response.json() == [TEST_BOOKS[1].model_dump()]
-        mock_update_book.assert_called_once_with(ANY, [UpdateBook.model_validate(TEST_BOOKS[0], from_attributes=True)])
+        mock_update_book.assert_called_once_with(
+            ANY, [UpdateBook.model_validate(TEST_BOOKS[0], from_attributes=True)], settings.duplicate_books
+        )
+
+
+def test_create_book_duplicate(client, set_policy):
+    set_policy(disabled_genres_create=[])
+
+    with patch(
+        "librarymanagement.controller.librarymanager.insert_book",
+        side_effect=DuplicateBookException(0),
+    ):
+        response = client.post("/books", json=TEST_BOOKS[0].model_dump(exclude={"id"}))
+        assert response.status_code == 409
+
+
+def test_update_book_duplicate(client, set_policy):
+    set_policy(disabled_genres_create=[])
+
+    with patch(
+        "librarymanagement.controller.librarymanager.update_books",
+        side_effect=DuplicateBookException(1),
+    ):
+        response = client.patch("/books", json=[{"id": 0, "title": "Book 2", "author": "Author 2"}])
+        assert response.status_code == 409
 
 
-def test_update_book_disabled_genre(client):
-    settings.disabled_genres_create = ["Genre 1"]
+def test_update_book_disabled_genre(client, set_policy):
+    set_policy(disabled_genres_create=["Genre 1"])
 
     with patch("librarymanagement.controller.librarymanager.update_books") as mock_update_book:
         response = client.patch("/books/", json=[TEST_BOOKS[0].model_dump()])
@@ -122,8 +157,8 @@ def test_update_book_disabled_genre(client):
         mock_update_book.assert_not_called()
 
 
-def test_update_book_invalid_id(client):
-    settings.disabled_genres_create = ["Genre 2"]
+def test_update_book_invalid_id(client, set_policy):
+    set_policy(disabled_genres_create=["Genre 2"])
 
     with patch(
         "librarymanagement.controller.librarymanager.update_books",
@@ -134,7 +169,9 @@ def test_update_book_invalid_id(client):
 
         assert response.status_code == 400
         assert response.json() == {"detail": "Invalid book id: 100"}
-        mock_update_book.assert_called_once_with(ANY, [UpdateBook.model_validate(TEST_BOOKS[0], from_attributes=True)])
+        mock_update_book.assert_called_once_with(
+            ANY, [UpdateBook.model_validate(TEST_BOOKS[0], from_attributes=True)], settings.duplicate_books
+        )
 
 
 def test_get_books_by_genre(client):
@@ -218,3 +255,216 @@ def test_delete_book_last_genre(client):
         assert response.status_code == 400
         assert response.json() == {"detail": "Last book in genre cannot be deleted: 100"}
         mock_delete_book.assert_called_once_with(ANY, 100)
+
+
+def test_bulk_delete_books(client):
+    with patch(
+        "librarymanagement.controller.librarymanager.delete_books_by_ids",
+        return_value=BulkDeleteResponse(deleted=[0, 1], skipped=[2]),
+    ) as mock_delete_books:
+        response = client.post("/books/bulk_delete", json=[0, 1, 2])
+
+        assert response.status_code == 200
+        assert response.json() == {"deleted": [0, 1], "skipped": [2], "not_found": []}
+        mock_delete_books.assert_called_once_with(ANY, [0, 1, 2])
+
+
+def test_bulk_delete_books_not_found(client):
+    with patch(
+        "librarymanagement.controller.librarymanager.delete_books_by_ids",
+        return_value=BulkDeleteResponse(deleted=[0], skipped=[], not_found=[100]),
+    ):
+        response = client.post("/books/bulk_delete", json=[0, 100])
+
+        assert response.status_code == 200
+        assert response.json() == {"deleted": [0], "skipped": [], "not_found": [100]}
+
+
+def test_get_changes(client, set_policy):
+    set_policy(masked_genres=["Genre 1"])
+    changes = BookChangesResponse(
+        changes=[
+            BookChange(version=3, id=0, book=TEST_BOOKS[0].model_copy()),
+            BookChange(version=4, id=1, book=TEST_BOOKS[1].model_copy()),
+            BookChange(version=5, id=2, deleted=True),
+        ],
+        next_token=5,
+        has_more=False,
+    )
+
+    with patch(
+        "librarymanagement.controller.librarymanager.get_book_changes",
+        return_value=changes,
+    ) as mock_get_book_changes:
+        response = client.get("/books/changes", params={"since": 2, "limit": 10})
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "changes": [
+                {"version": 3, "id": 0, "deleted": False, "book": {**TEST_BOOKS[0].model_dump(), "title": "*" * 10}},
+                {"version": 4, "id": 1, "deleted": False, "book": TEST_BOOKS[1].model_dump()},
+                {"version": 5, "id": 2, "deleted": True, "book": None},
+            ],
+            "next_token": 5,
+            "has_more": False,
+        }
+        mock_get_book_changes.assert_called_once_with(ANY, since=2, limit=10)
+
+
+def test_get_changes_invalid_limit(client):
+    with patch("librarymanagement.controller.librarymanager.get_book_changes") as mock_get_book_changes:
+        response = client.get("/books/changes", params={"limit": 0})
+
+        assert response.status_code == 422
+        mock_get_book_changes.assert_not_called()
+
+
+def test_get_events_resync(client):
+    with client.stream("GET", "/books/events", headers={"Last-Event-ID": str(10**9)}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.read() == b"event: resync\ndata: {}\n\n"
+
+
+def test_get_books_rejected_when_list_queue_full(client):
+    settings.admission_retry_after = 5
+    full = AdmissionController("list", max_concurrency=0, max_queue=0)
+
+    with patch.dict("librarymanagement.core.admission.admission_controllers", {"list": full}):
+        with patch("librarymanagement.controller.librarymanager.get_all_books") as mock_get_all_books:
+            response = client.get("/books")
+
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "5"
+            assert response.json() == {"detail": "Too many concurrent list requests, try again later"}
+            assert full.rejected == 1
+            mock_get_all_books.assert_not_called()
+
+        with patch(
+            "librarymanagement.controller.librarymanager.get_book_by_id",
+            return_value=TEST_BOOKS[0],
+        ):
+            assert client.get("/books/0").status_code == 200
+
+
+def test_get_books_from_snapshot(client, set_policy):
+    settings.read_engine = "snapshot"
+    set_policy(disabled_genres_search=["Genre 1"])
+
+    try:
+        with patch(
+            "librarymanagement.controller.librarymanager.catalogue_snapshot.get_all_books",
+            return_value=TEST_BOOKS,
+        ) as mock_snapshot_get_all_books:
+            with patch("librarymanagement.controller.librarymanager.get_all_books") as mock_get_all_books:
+                response = client.get("/books", params={"author": "Author 1"})
+
+                assert response.status_code == 200
+                mock_snapshot_get_all_books.assert_called_once_with(
+                    ANY, author="Author 1", title=None, excluded_genres=frozenset({"Genre 1"})
+                )
+                mock_get_all_books.assert_not_called()
+    finally:
+        settings.read_engine = "sqlite"
+
+
+def test_get_books_from_sharded_storage(client, set_policy):
+    set_policy(disabled_genres_search=["Genre 1"])
+
+    with patch("librarymanagement.controller.librarymanager.sharded_storage") as mock_sharded_storage:
+        mock_sharded_storage.get_all_books.return_value = TEST_BOOKS
+        with patch("librarymanagement.controller.librarymanager.get_all_books") as mock_get_all_books:
+            response = client.get("/books", params={"author": "Author 1"})
+
+            assert response.status_code == 200
+            mock_sharded_storage.get_all_books.assert_called_once_with(
+                author="Author 1", title=None, excluded_genres=frozenset({"Genre 1"})
+            )
+            mock_get_all_books.assert_not_called()
+
+
+def test_create_book_in_sharded_storage(client, set_policy):
+    set_policy(disabled_genres_create=[])
+
+    with patch("librarymanagement.controller.librarymanager.sharded_storage") as mock_sharded_storage:
+        mock_sharded_storage.insert_book.return_value = TEST_BOOKS[0]
+        response = client.post("/books", json=TEST_BOOKS[0].model_dump(exclude={"id"}))
+
+        assert response.status_code == 200
+        assert response.json() == TEST_BOOKS[0].model_dump()
+        mock_sharded_storage.insert_book.assert_called_once_with(
+            NewBook(**TEST_BOOKS[0].model_dump(exclude={"id"})), settings.duplicate_books
+        )
+
+
+def test_get_book_invalid_id_in_sharded_storage(client):
+    with patch("librarymanagement.controller.librarymanager.sharded_storage") as mock_sharded_storage:
+        mock_sharded_storage.get_book_by_id.side_effect = InvalidBookIdException(100)
+        response = client.get("/books/100")
+
+        assert response.status_code == 404
+
+
+def test_get_changes_not_available_with_sharded_storage(client):
+    with patch("librarymanagement.controller.librarymanager.sharded_storage"):
+        response = client.get("/books/changes")
+
+        assert response.status_code == 501
+
+
+def test_get_books_with_fields(client, set_policy):
+    set_policy(masked_genres=["Genre 2"])
+
+    with patch(
+        "librarymanagement.controller.librarymanager.get_all_books",
+        return_value=[BookRow(**book.model_dump()) for book in TEST_BOOKS],
+    ) as mock_get_all_books:
+        response = client.get("/books", params={"fields": "id, title,id"})
+
+        assert response.status_code == 200
+        assert response.json() == [
+            {"id": 0, "title": "Book 1"},
+            {"id": 1, "title": "**********"},
+            {"id": 2, "title": "Book 3"},
+        ]
+        mock_get_all_books.assert_called_once_with(ANY, fields=("id", "title"))
+
+
+@pytest.mark.parametrize("fields", ["", "id,isbn"])
+def test_get_books_with_invalid_fields(client, fields):
+    with patch("librarymanagement.controller.librarymanager.get_all_books") as mock_get_all_books:
+        response = client.get("/books", params={"fields": fields})
+
+        assert response.status_code == 400
+        mock_get_all_books.assert_not_called()
+
+
+def test_get_book_with_fields(client, set_policy):
+    set_policy(masked_genres=[])
+
+    with patch(
+        "librarymanagement.controller.librarymanager.get_book_by_id",
+        return_value=BookRow(**TEST_BOOKS[0].model_dump()),
+    ) as mock_get_book:
+        response = client.get("/books/0", params={"fields": "author"})
+
+        assert response.status_code == 200
+        assert response.json() == {"author": "Author 1"}
+        mock_get_book.assert_called_once_with(ANY, 0, ("author",))
+
+
+def test_get_books_by_genre_with_fields(client):
+    with patch(
+        "librarymanagement.controller.librarymanager.get_all_books",
+        return_value=[BookRow(**book.model_dump()) for book in TEST_BOOKS],
+    ):
+        response = client.get("/books/group_by_genre", params={"fields": "id"})
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "genres": {
+                "Genre 1": {"books": [{"id": 0}], "count": 1},
+                "Genre 2": {"books": [{"id": 1}], "count": 1},
+                "Genre 3": {"books": [{"id": 2}], "count": 1},
+            }
+        }
@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy.orm import Session
+from starlette.testclient import TestClient
+
+from librarymanagement.core.settings import settings
+from librarymanagement.main import app
+from librarymanagement.repository.database import get_session
+from test.conftest import BOOK_COUNT
+
+
+@pytest.fixture
+def client(db_engine, monkeypatch, set_policy):
+    def override_get_session():
+        with Session(db_engine) as session:
+            yield session
+
+    monkeypatch.setattr(settings, "read_engine", "sqlite")
+    monkeypatch.setattr(settings, "write_pipeline_enabled", False)
+    set_policy(disabled_genres_create=[])
+    monkeypatch.setattr(settings, "duplicate_books", "allow")
+    app.dependency_overrides[get_session] = override_get_session
+    yield TestClient(app)
+    del app.dependency_overrides[get_session]
+
+
+def test_get_books_budget(client, books, query_counter):
+    with query_counter.measure():
+        response = client.get("/books/")
+
+    assert len(response.json()) == BOOK_COUNT
+    query_counter.assert_budget(queries=1)
+
+
+def test_search_books_budget(client, books, query_counter):
+    with query_counter.measure():
+        response = client.get("/books/", params={"author": "Author 99", "fields": "id,title"})
+
+    assert len(response.json()) == BOOK_COUNT // 100
+    query_counter.assert_budget(queries=1)
+
+
+def test_get_book_budget(client, books, query_counter):
+    with query_counter.measure():
+        assert client.get("/books/500").status_code == 200
+
+    query_counter.assert_budget(queries=1)
+    query_counter.assert_no_full_scans()
+
+
+def test_create_book_budget(client, books, query_counter):
+    new_book = {"title": "New", "author": "Author", "genre": "Genre 1", "publication_year": 2030}
+
+    with query_counter.measure():
+        assert client.post("/books/", json=new_book).status_code == 200
+
+    query_counter.assert_budget(queries=2, rows_written=1)
+
+
+def test_update_books_budget(client, books, query_counter):
+    updates = [{"id": book_id, "title": f"Updated {book_id}"} for book_id in range(1, BOOK_COUNT + 1)]
+
+    with query_counter.measure():
+        response = client.patch("/books/", json=updates)
+
+    assert len(response.json()) == BOOK_COUNT
+    query_counter.assert_budget(queries=5, rows_written=BOOK_COUNT)
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from librarymanagement.core.admission import AdmissionController
+from librarymanagement.core.exeptions import AdmissionRejectedException
+
+
+def test_acquire_within_limit():
+    async def run():
+        controller = AdmissionController("list", max_concurrency=2, max_queue=0)
+        await controller.acquire()
+        await controller.acquire()
+        return controller
+
+    controller = asyncio.run(run())
+    assert controller.stats() == {
+        "active": 2,
+        "waiting": 0,
+        "admitted": 2,
+        "rejected": 0,
+        "max_concurrency": 2,
+        "max_queue": 0,
+    }
+
+
+def test_acquire_rejects_when_queue_full():
+    async def run():
+        controller = AdmissionController("list", max_concurrency=1, max_queue=1)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejectedException):
+            await controller.acquire()
+        assert controller.waiting == 1
+
+        controller.release()
+        await waiter
+        return controller
+
+    controller = asyncio.run(run())
+    assert (controller.active, controller.waiting, controller.admitted, controller.rejected) == (1, 0, 2, 1)
+
+
+def test_release_hands_slot_to_waiter_in_order():
+    async def run():
+        controller = AdmissionController("list", max_concurrency=1, max_queue=2)
+        order = []
+
+        async def request(name):
+            await controller.acquire()
+            order.append(name)
+
+        await controller.acquire()
+        tasks = [asyncio.create_task(request(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        controller.release()
+        await asyncio.sleep(0)
+        controller.release()
+        await asyncio.gather(*tasks)
+        controller.release()
+        return controller, order
+
+    controller, order = asyncio.run(run())
+    assert order == ["first", "second"]
+    assert controller.active == 0
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def run():
+        controller = AdmissionController("list", max_concurrency=1, max_queue=1)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        controller.release()
+        return controller
+
+    controller = asyncio.run(run())
+    assert (controller.active, controller.waiting) == (0, 0)
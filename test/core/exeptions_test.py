@@ -1,6 +1,11 @@
 import pytest
 
-from librarymanagement.core.exeptions import InvalidBookIdException, LastBookGenreDeleteException
+from librarymanagement.core.exeptions import (
+    InvalidBookIdException,
+    LastBookGenreDeleteException,
+    AdmissionRejectedException,
+    DuplicateBookException,
+)
 
 
 def test_invalid_book_id_exception():
@@ -15,3 +20,17 @@ def test_last_book_genre_delete_execption():
         raise LastBookGenreDeleteException(10)
 
     assert "10" in str(execinfo.value)
+
+
+def test_admission_rejected_exception():
+    with pytest.raises(AdmissionRejectedException) as execinfo:
+        raise AdmissionRejectedException("list")
+
+    assert "list" in str(execinfo.value)
+
+
+def test_duplicate_book_exception():
+    with pytest.raises(DuplicateBookException) as execinfo:
+        raise DuplicateBookException(10)
+
+    assert "10" in str(execinfo.value)
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from unittest.mock import patch, MagicMock
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+
+from librarymanagement.main import app
+from librarymanagement.repository.database import Base, get_session
+from librarymanagement.repository.idempotency_store import idempotency_store
+from librarymanagement.service.schema import Book
+
+BOOK = Book(id=1, title="Book 1", author="Author 1", genre="Genre 1", publication_year=2020)
+NEW_BOOK = BOOK.model_dump(exclude={"id"})
+
+
+def override_get_session():
+    return MagicMock()
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch, set_policy):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(idempotency_store, "session_factory", sessionmaker(bind=engine))
+    set_policy(disabled_genres_create=[], masked_genres=[])
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_session] = override_get_session
+    return TestClient(app)
+
+
+def test_retry_replays_stored_response(client):
+    with patch("librarymanagement.controller.librarymanager.insert_book", return_value=BOOK) as mock_insert_book:
+        first = client.post("/books/", json=NEW_BOOK, headers={"Idempotency-Key": "key"})
+        retry = client.post("/books/", json=NEW_BOOK, headers={"Idempotency-Key": "key"})
+
+        assert first.status_code == retry.status_code == 200
+        assert first.json() == retry.json() == BOOK.model_dump()
+        assert "idempotent-replayed" not in first.headers
+        assert retry.headers["idempotent-replayed"] == "true"
+        mock_insert_book.assert_called_once()
+
+
+def test_patch_retry_replays_stored_response(client):
+    with patch("librarymanagement.controller.librarymanager.update_books", return_value=[BOOK]) as mock_update_books:
+        first = client.patch("/books/", json=[{"id": 1, "title": "Book 1"}], headers={"Idempotency-Key": "key"})
+        retry = client.patch("/books/", json=[{"id": 1, "title": "Book 1"}], headers={"Idempotency-Key": "key"})
+
+        assert first.json() == retry.json() == [BOOK.model_dump()]
+        assert retry.headers["idempotent-replayed"] == "true"
+        mock_update_books.assert_called_once()
+
+
+def test_key_reused_for_different_request(client):
+    with patch("librarymanagement.controller.librarymanager.insert_book", return_value=BOOK) as mock_insert_book:
+        client.post("/books/", json=NEW_BOOK, headers={"Idempotency-Key": "key"})
+        response = client.post("/books/", json={**NEW_BOOK, "title": "Other"}, headers={"Idempotency-Key": "key"})
+
+        assert response.status_code == 422
+        mock_insert_book.assert_called_once()
+
+
+def test_failed_request_is_not_stored(client, set_policy):
+    set_policy(disabled_genres_create=["Genre 1"])
+
+    with patch("librarymanagement.controller.librarymanager.insert_book", return_value=BOOK) as mock_insert_book:
+        assert client.post("/books/", json=NEW_BOOK, headers={"Idempotency-Key": "key"}).status_code == 400
+        set_policy(disabled_genres_create=[])
+        assert client.post("/books/", json=NEW_BOOK, headers={"Idempotency-Key": "key"}).status_code == 200
+
+        mock_insert_book.assert_called_once()
+
+
+def test_requests_without_key_are_not_stored(client):
+    with patch("librarymanagement.controller.librarymanager.insert_book", return_value=BOOK) as mock_insert_book:
+        client.post("/books/", json=NEW_BOOK)
+        client.post("/books/", json=NEW_BOOK)
+
+        assert mock_insert_book.call_count == 2
+
+
+def test_key_too_long(client):
+    response = client.post("/books/", json=NEW_BOOK, headers={"Idempotency-Key": "k" * 256})
+
+    assert response.status_code == 400
+
+
+def test_concurrent_duplicates_are_coalesced():
+    app.dependency_overrides[get_session] = override_get_session
+
+    def slow_insert_book(session, book, on_duplicate):
+        time.sleep(0.2)
+        return BOOK
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(client.post("/books/", json=NEW_BOOK, headers={"Idempotency-Key": "key"}) for _ in range(3))
+            )
+
+    with patch(
+        "librarymanagement.controller.librarymanager.insert_book", side_effect=slow_insert_book
+    ) as mock_insert_book:
+        responses = asyncio.run(run())
+
+        assert [response.json() for response in responses] == [BOOK.model_dump()] * 3
+        assert sorted(response.headers.get("idempotent-replayed", "false") for response in responses) == [
+            "false",
+            "true",
+            "true",
+        ]
+        mock_insert_book.assert_called_once()
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+from pydantic import ValidationError
+
+from librarymanagement.core.policy import Policy, PolicyStore
+
+POLICY = Policy(frozenset({"Horror"}), frozenset({"18+"}), frozenset({"18+"}))
+
+
+@pytest.fixture
+def env_file(tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text('MASKED_GENRES=["18+"]\nDISABLED_GENRES_SEARCH=["18+"]\nDISABLED_GENRES_CREATE=["Horror"]\n')
+    return env_file
+
+
+def edit(env_file, text: str):
+    env_file.write_text(text)
+    # Modification times can be coarser than the test, move it forward explicitly
+    mtime = env_file.stat().st_mtime + 10
+    os.utime(env_file, (mtime, mtime))
+
+
+def test_reload_swaps_policy(env_file):
+    store = PolicyStore(POLICY, str(env_file))
+    edit(env_file, 'MASKED_GENRES=["Genre 1", "Genre 2"]\nDISABLED_GENRES_SEARCH=[]\nDISABLED_GENRES_CREATE=["Horror"]')
+
+    policy = store.reload()
+
+    assert policy == Policy(frozenset({"Horror"}), frozenset(), frozenset({"Genre 1", "Genre 2"}), 1)
+    assert store.current() is policy
+
+
+def test_reload_with_same_rules_keeps_policy(env_file):
+    store = PolicyStore(POLICY, str(env_file))
+
+    assert store.reload() is POLICY
+
+
+def test_invalid_settings_keep_policy(env_file):
+    store = PolicyStore(POLICY, str(env_file))
+    edit(env_file, "MASKED_GENRES=not a list")
+
+    with pytest.raises(ValidationError):
+        store.reload()
+    assert store.current() is POLICY
+
+
+def test_changed_env_file_is_picked_up(env_file):
+    store = PolicyStore(POLICY, str(env_file), check_interval=0.01)
+    store._next_check = 0
+    edit(env_file, 'MASKED_GENRES=["Genre 1"]')
+
+    assert store.current().masked_genres == frozenset({"Genre 1"})
+    assert store.current().version == 1
+
+
+def test_env_file_is_not_checked_before_interval(env_file):
+    store = PolicyStore(POLICY, str(env_file), check_interval=60)
+    edit(env_file, 'MASKED_GENRES=["Genre 1"]')
+
+    assert store.current() is POLICY
+
+
+def test_invalid_env_file_is_ignored_by_watch(env_file):
+    store = PolicyStore(POLICY, str(env_file), check_interval=0.01)
+    store._next_check = 0
+    edit(env_file, "MASKED_GENRES=not a list")
+
+    assert store.current() is POLICY
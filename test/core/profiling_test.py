@@ -0,0 +1,141 @@
+import time
+from unittest.mock import patch, MagicMock
+
+import pytest
+from starlette.testclient import TestClient
+
+from librarymanagement.core.profiling import (
+    PROFILE_TOKEN_HEADER,
+    ProfilingMiddleware,
+    StackSampler,
+    is_valid_profile_token,
+    list_profiles,
+    sign_profile_token,
+    write_profile,
+)
+from librarymanagement.core.settings import settings
+from librarymanagement.main import app
+from librarymanagement.repository.database import get_session
+
+
+@pytest.fixture
+def profiling_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiling_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "profiling_max_files", 3)
+    monkeypatch.setattr(settings, "profiling_secret", "secret")
+    monkeypatch.setattr(settings, "profiling_sample_rate", 0.0)
+    return tmp_path
+
+
+def override_get_session():
+    return MagicMock()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "token")
+    app.dependency_overrides[get_session] = override_get_session
+    yield TestClient(app, headers={"X-Admin-Token": "token"})
+    del app.dependency_overrides[get_session]
+
+
+def test_profile_token():
+    token = sign_profile_token("secret", int(time.time()) + 60)
+
+    assert is_valid_profile_token("secret", token)
+    assert not is_valid_profile_token("other", token)
+    assert not is_valid_profile_token(None, token)
+    assert not is_valid_profile_token("secret", "invalid")
+
+
+def test_expired_profile_token():
+    assert not is_valid_profile_token("secret", sign_profile_token("secret", int(time.time()) - 1))
+
+
+@pytest.mark.parametrize("token", ["\xb2.x", "9999999999.\xe9", "\u0663.x"])
+def test_non_ascii_profile_token(token):
+    assert not is_valid_profile_token("secret", token)
+
+
+@pytest.mark.parametrize("token", [b"\xb2.x", b"9999999999.\xe9"])
+def test_non_ascii_profile_token_header_is_not_profiled(profiling_dir, token):
+    # Raw header bytes, the test client would send them UTF-8 encoded
+    scope = {"type": "http", "headers": [(PROFILE_TOKEN_HEADER, token)]}
+
+    assert not ProfilingMiddleware(None).should_profile(scope)
+
+
+def busy_function(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def test_stack_sampler():
+    sampler = StackSampler(0.001)
+    sampler.start()
+    busy_function(0.05)
+    sampler.stop()
+
+    assert any("busy_function (profiling_test.py:" in stack for stack in sampler.samples)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in sampler.collapsed().splitlines())
+
+
+def test_stack_sampler_stops_after_max_duration():
+    sampler = StackSampler(0.001, max_duration=0.02)
+    sampler.start()
+    busy_function(0.1)
+
+    assert not sampler._thread.is_alive()
+    sampler.stop()
+    assert sampler.truncated
+    assert 0 < sampler.samples.total() < 50
+
+
+def test_write_profile_keeps_bounded_ring(profiling_dir):
+    for index in range(5):
+        write_profile(f"{index}.collapsed", "main 1\n")
+
+    assert [path.name for path in list_profiles()] == ["2.collapsed", "3.collapsed", "4.collapsed"]
+
+
+def test_request_with_token_is_profiled(client, profiling_dir):
+    token = sign_profile_token("secret", int(time.time()) + 60)
+
+    with patch("librarymanagement.controller.librarymanager.get_all_books", return_value=[]):
+        response = client.get("/books/", headers={"X-Profile-Token": token})
+
+    assert response.status_code == 200
+    name = response.headers["X-Profile-Id"]
+    assert name.endswith("-GET-books.collapsed")
+    assert client.get("/admin/profiles").json() == [name]
+
+    download = client.get(f"/admin/profiles/{name}")
+    assert download.status_code == 200
+    assert download.text == (profiling_dir / name).read_text()
+
+
+def test_request_without_token_is_not_profiled(client, profiling_dir):
+    token = sign_profile_token("other", int(time.time()) + 60)
+
+    with patch("librarymanagement.controller.librarymanager.get_all_books", return_value=[]):
+        response = client.get("/books/", headers={"X-Profile-Token": token})
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert list_profiles() == []
+
+
+def test_sampled_request_is_profiled(client, profiling_dir, monkeypatch):
+    monkeypatch.setattr(settings, "profiling_sample_rate", 1.0)
+
+    with patch("librarymanagement.controller.librarymanager.get_all_books", return_value=[]):
+        response = client.get("/books/")
+
+    assert [path.name for path in list_profiles()] == [response.headers["X-Profile-Id"]]
+
+
+def test_get_unknown_profile(client, profiling_dir):
+    response = client.get("/admin/profiles/..%2Fsecret.collapsed")
+
+    assert response.status_code == 404
@@ -0,0 +1,96 @@
+import pytest
+
+from librarymanagement.repository.crud import (
+    get_all_books,
+    get_book_by_id,
+    insert_book,
+    update_books,
+    delete_book_by_id,
+    delete_books_by_ids,
+    find_duplicate,
+    get_data_version,
+    get_book_changes,
+)
+from librarymanagement.service.schema import NewBook, UpdateBook
+from test.conftest import BOOK_COUNT
+
+
+def test_get_all_books_budget(db_session, books, query_counter):
+    with query_counter.measure():
+        assert len(get_all_books(db_session, author="Author 1", excluded_genres=["Genre 2"])) > 0
+
+    query_counter.assert_budget(queries=1, rows_written=0)
+
+
+def test_get_book_by_id_budget(db_session, books, query_counter):
+    with query_counter.measure():
+        get_book_by_id(db_session, 500)
+
+    query_counter.assert_budget(queries=1)
+    query_counter.assert_no_full_scans()
+
+
+def test_insert_book_budget(db_session, books, query_counter):
+    with query_counter.measure():
+        insert_book(db_session, NewBook(title="New", author="Author", genre="Genre 1", publication_year=2030), "reject")
+
+    # BEGIN IMMEDIATE, the duplicate lookup, the insert and reading back the version of its event
+    query_counter.assert_budget(queries=4, rows_written=1)
+    query_counter.assert_no_full_scans()
+
+
+# BEGIN IMMEDIATE, two chunked lookups, the current version and one executemany, with reject two chunked duplicate
+# lookups
+@pytest.mark.parametrize("on_duplicate, queries", [("allow", 5), ("reject", 7)])
+def test_update_books_budget(db_session, books, query_counter, on_duplicate, queries):
+    updates = [UpdateBook(id=book_id, title=f"Updated {book_id}") for book_id in range(1, BOOK_COUNT + 1)]
+
+    with query_counter.measure():
+        update_books(db_session, updates, on_duplicate)
+
+    query_counter.assert_budget(queries=queries, rows_written=BOOK_COUNT)
+    query_counter.assert_no_full_scans()
+
+
+def test_update_books_allocates_a_version_per_book(db_session, books):
+    updated_books = update_books(db_session, [UpdateBook(id=book_id, genre="Genre 0") for book_id in (3, 1, 2)])
+
+    assert [book.genre for book in updated_books] == ["Genre 0"] * 3
+    changes = get_book_changes(db_session, since=BOOK_COUNT).changes
+    assert sorted(change.id for change in changes) == [1, 2, 3]
+    assert [change.version for change in changes] == [BOOK_COUNT + 1, BOOK_COUNT + 2, BOOK_COUNT + 3]
+
+
+def test_delete_book_by_id_budget(db_session, books, query_counter):
+    with query_counter.measure():
+        delete_book_by_id(db_session, 500)
+
+    # The lookup, the genre count, the tombstone, the delete and reading back the version of the event
+    query_counter.assert_budget(queries=5, rows_written=2)
+    query_counter.assert_no_full_scans()
+
+
+def test_delete_books_by_ids_budget(db_session, books, query_counter):
+    with query_counter.measure():
+        delete_books_by_ids(db_session, list(range(1, BOOK_COUNT + 1)))
+
+    # BEGIN IMMEDIATE, one grouped genre count, two id lookups, the current version, one executemany of the tombstones
+    # and two deletes of 500 books
+    query_counter.assert_budget(queries=8, rows_written=2 * (BOOK_COUNT - 10))
+
+
+def test_find_duplicate_uses_content_hash_index(db_session, books, query_counter):
+    with query_counter.measure():
+        assert find_duplicate(db_session, "book 1", "author 1", 2001).id == 1
+
+    query_counter.assert_budget(queries=1)
+    query_counter.assert_no_full_scans()
+
+
+def test_get_book_changes_budget(db_session, books, query_counter):
+    with query_counter.measure():
+        assert get_data_version(db_session) == BOOK_COUNT
+        get_book_changes(db_session, since=BOOK_COUNT - 10)
+
+    query_counter.assert_budget(queries=4)
+    query_counter.assert_no_full_scans()
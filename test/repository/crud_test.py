@@ -1,18 +1,38 @@
+import threading
+import time
+from unittest.mock import patch, call
+
 import pytest
-from sqlalchemy import select, create_engine, func
+from sqlalchemy import select, create_engine, func, event, text
 from sqlalchemy.orm import sessionmaker
 
-from librarymanagement.core.exeptions import InvalidBookIdException, LastBookGenreDeleteException
+from librarymanagement.core.exeptions import (
+    InvalidBookIdException,
+    LastBookGenreDeleteException,
+    DuplicateBookException,
+)
 from librarymanagement.repository.crud import (
+    find_duplicate,
+    iter_duplicate_groups,
     get_all_books,
     get_book_by_id,
     insert_book,
     update_books,
     delete_book_by_id,
+    delete_books_by_ids,
+    get_book_changes,
 )
 from librarymanagement.repository.database import Base
-from librarymanagement.repository.models import BookORM
-from librarymanagement.service.schema import Book, NewBook, UpdateBook
+from librarymanagement.repository.models import BookORM, BookTombstoneORM, content_hash
+from librarymanagement.service.schema import (
+    Book,
+    BookRow,
+    NewBook,
+    UpdateBook,
+    BulkDeleteResponse,
+    BookChange,
+    BookChangesResponse,
+)
 
 
 @pytest.fixture
@@ -80,13 +100,28 @@ def orm_books(books: list[Book]) -> list[BookORM]:
     ]
 
 
+def book_rows(books: list[Book]) -> list[BookRow]:
+    return [BookRow(**book.model_dump()) for book in books]
+
+
 def test_get_all_books(session):
     session.add_all(orm_books(TEST_BOOKS))
     session.commit()
 
     result = get_all_books(session)
 
-    assert result == TEST_BOOKS
+    assert result == book_rows(TEST_BOOKS)
+
+
+def test_get_all_books_does_not_track_orm_objects(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+    session.expunge_all()
+
+    get_all_books(session)
+    get_book_by_id(session, 3)
+
+    assert len(session.identity_map) == 0
 
 
 @pytest.mark.parametrize(
@@ -108,7 +143,30 @@ def test_get_all_books_with_filters(session, books, expected, author, title, exc
 
     result = get_all_books(session, author=author, title=title, excluded_genres=excluded_genres)
 
-    assert result == expected
+    assert result == book_rows(expected)
+
+
+def test_get_all_books_selects_requested_fields(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+    statements = []
+    event.listen(
+        session.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+
+    result = get_all_books(session, author="Author 5", fields=("title", "id"))
+
+    assert [row._asdict() for row in result] == [
+        {"id": book.id, "title": book.title, "genre": book.genre} for book in TEST_BOOKS[4:8]
+    ]
+    assert statements[0].startswith("SELECT books.id, books.title, books.genre \nFROM books")
+
+
+def test_get_book_by_id_selects_requested_fields(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    assert get_book_by_id(session, 3, fields=("author",))._asdict() == {"author": "Author 4", "genre": "Genre 3"}
 
 
 def test_get_book_by_id(session):
@@ -117,7 +175,7 @@ def test_get_book_by_id(session):
 
     result = get_book_by_id(session, 3)
 
-    assert result == TEST_BOOKS[3]
+    assert result == BookRow(**TEST_BOOKS[3].model_dump())
 
 
 def test_get_book_by_id_not_found(session):
@@ -138,10 +196,162 @@ def test_insert_book(session):
     expected_book_orm = orm_books([expected_book])[0]
     result = insert_book(session, newbook)
 
-    assert result == expected_book
+    assert result == BookRow(**expected_book.model_dump())
     assert session.execute(select(BookORM).filter(BookORM.id == 1)).scalars().first() == expected_book_orm
 
 
+def test_content_hash_is_normalized():
+    assert content_hash("Book  1", "Author 1", 2021) == content_hash(" BOOK 1", "author\t1 ", 2021)
+    assert content_hash("Book 1", "Author 1", 2021) != content_hash("Book 1", "Author 1", 2022)
+    assert content_hash("Book 1", "Author 1", 2021) != content_hash("Book", "1 Author 1", 2021)
+
+
+@pytest.mark.parametrize("on_duplicate", ["allow", "reject", "return_existing"])
+def test_insert_book_duplicate(session, on_duplicate):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+    duplicate = NewBook(title="book 1", author="AUTHOR 1", genre="Genre 2", publication_year=2021)
+
+    if on_duplicate == "reject":
+        with pytest.raises(DuplicateBookException) as execinfo:
+            insert_book(session, duplicate, on_duplicate)
+        assert execinfo.value.id == 0
+    elif on_duplicate == "return_existing":
+        assert insert_book(session, duplicate, on_duplicate) == BookRow(**TEST_BOOKS[0].model_dump())
+    else:
+        assert insert_book(session, duplicate, on_duplicate).id == len(TEST_BOOKS)
+
+    expected_count = len(TEST_BOOKS) + (on_duplicate == "allow")
+    assert session.execute(select(func.count()).select_from(BookORM)).scalar() == expected_count
+
+
+def test_concurrent_duplicate_inserts_rejected(db_engine):
+    new_book = NewBook(title="Book 1", author="Author 1", genre="Genre 1", publication_year=2021)
+    results = []
+
+    def slow_find_duplicate(*args, **kwargs):
+        # Without the write lock both inserts would find no duplicate in this window
+        duplicate = find_duplicate(*args, **kwargs)
+        time.sleep(0.2)
+        return duplicate
+
+    def insert():
+        with sessionmaker(bind=db_engine)() as db:
+            try:
+                results.append(insert_book(db, new_book, "reject").id)
+            except DuplicateBookException as e:
+                results.append(e)
+
+    with patch("librarymanagement.repository.crud.find_duplicate", slow_find_duplicate):
+        threads = [threading.Thread(target=insert) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(results) == 2
+    assert [isinstance(result, DuplicateBookException) for result in results].count(True) == 1
+    with sessionmaker(bind=db_engine)() as db:
+        assert db.execute(select(func.count()).select_from(BookORM)).scalar() == 1
+
+
+def test_concurrent_partial_updates_keep_both_changes(db_engine):
+    with sessionmaker(bind=db_engine)() as db:
+        book_id = insert_book(db, NewBook(title="t0", author="a0", genre="Genre 1", publication_year=2021)).id
+
+    def update_author():
+        with sessionmaker(bind=db_engine)() as db:
+            update_books(db, [UpdateBook(id=book_id, author="a1")])
+
+    other_update = threading.Thread(target=update_author)
+
+    def interleaved_content_hash(*args):
+        # Runs between the read and the write of the title update, the first time only
+        if other_update.ident is None:
+            other_update.start()
+            time.sleep(0.2)
+        return content_hash(*args)
+
+    with patch("librarymanagement.repository.crud.content_hash", interleaved_content_hash):
+        with sessionmaker(bind=db_engine)() as db:
+            update_books(db, [UpdateBook(id=book_id, title="t1")])
+        other_update.join()
+
+    with sessionmaker(bind=db_engine)() as db:
+        assert db.execute(select(BookORM.title, BookORM.author).where(BookORM.id == book_id)).one() == ("t1", "a1")
+
+
+def test_update_books_duplicate_rejected(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    with pytest.raises(DuplicateBookException) as execinfo:
+        update_books(
+            session,
+            [
+                UpdateBook(id=2, genre="Genre 9"),
+                UpdateBook(id=1, title="Book 1", author="Author 1", publication_year=2021),
+            ],
+            "reject",
+        )
+
+    assert execinfo.value.id == 0
+    assert get_book_by_id(session, 2).genre == "Genre 3"
+
+
+def test_update_books_duplicate_within_batch_rejected(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    with pytest.raises(DuplicateBookException):
+        update_books(
+            session,
+            [
+                UpdateBook(id=0, title="Same", publication_year=2000),
+                UpdateBook(id=1, title="Same", author="Author 1", publication_year=2000),
+            ],
+            "reject",
+        )
+
+
+def test_update_books_without_content_change_is_not_a_duplicate(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    assert update_books(session, [UpdateBook(id=0, title="Book 1", genre="Genre 9")], "reject")[0].genre == "Genre 9"
+
+
+def test_find_duplicate(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    assert find_duplicate(session, "BOOK 2", "author 2", 2022) == BookRow(**TEST_BOOKS[1].model_dump())
+    assert find_duplicate(session, "Book 2", "Author 2", 2022, exclude_id=1) is None
+
+
+def test_iter_duplicate_groups(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+    for title in ["BOOK 2", "book 2"]:
+        insert_book(session, NewBook(title=title, author="Author 2", genre="Genre 1", publication_year=2022))
+    insert_book(session, NewBook(title="Book 1", author="Author 1", genre="Genre 1", publication_year=2021))
+
+    groups = sorted(iter_duplicate_groups(session))
+
+    assert [[book.id for book in group] for group in groups] == [[0, 10], [1, 8, 9]]
+
+
+def test_iter_duplicate_groups_streams_covering_index(session):
+    statements = []
+    event.listen(
+        session.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+    list(iter_duplicate_groups(session))
+
+    plan = session.execute(text(f"EXPLAIN QUERY PLAN {statements[0]}")).all()
+    assert [row[-1] for row in plan] == ["SCAN books USING COVERING INDEX ix_books_content_hash"]
+
+
 def test_update_books(session):
     session.add_all(orm_books(TEST_BOOKS))
     session.commit()
@@ -183,7 +393,7 @@ def test_update_books(session):
 
     result = update_books(session, updated_books)
 
-    assert result == expected_return_value
+    assert result == book_rows(expected_return_value)
     assert session.execute(select(BookORM).filter(BookORM.id.in_([0, 1]))).scalars().all() == expected_return_value_orm
 
 
@@ -216,7 +426,7 @@ def test_update_books_partial(session):
 
     result = update_books(session, updated_books)
 
-    assert result == expected_return_value
+    assert result == book_rows(expected_return_value)
     assert session.execute(select(BookORM).filter(BookORM.id.in_([0, 1]))).scalars().all() == expected_return_value_orm
 
 
@@ -276,3 +486,148 @@ def test_delete_book_last_genre(session):
         delete_book_by_id(session, 0)
 
     assert session.execute(select(func.count()).select_from(BookORM)).scalar() == len(TEST_BOOKS)
+
+
+def test_delete_books_by_ids(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    result = delete_books_by_ids(session, [2, 3, 4])
+
+    assert result == BulkDeleteResponse(deleted=[2, 3, 4], skipped=[])
+    assert session.execute(select(BookORM.id).order_by(BookORM.id)).scalars().all() == [0, 1, 5, 6, 7]
+
+
+def test_delete_books_by_ids_skips_last_in_genre(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    result = delete_books_by_ids(session, [0, 2, 3, 4, 5, 6])
+
+    assert result == BulkDeleteResponse(deleted=[2, 3, 4], skipped=[0, 5, 6])
+    assert session.execute(select(BookORM.id).order_by(BookORM.id)).scalars().all() == [0, 1, 5, 6, 7]
+
+
+def test_delete_books_by_ids_chunked(session, monkeypatch):
+    monkeypatch.setattr("librarymanagement.repository.crud.BULK_CHUNK_SIZE", 2)
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    result = delete_books_by_ids(session, [3, 3, 4, 5, 2])
+
+    assert result == BulkDeleteResponse(deleted=[3, 4, 5], skipped=[2])
+    assert session.execute(select(func.count()).select_from(BookORM)).scalar() == len(TEST_BOOKS) - 3
+
+
+def test_delete_books_by_ids_not_found(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    result = delete_books_by_ids(session, [2, 100, 3])
+
+    assert result == BulkDeleteResponse(deleted=[2, 3], skipped=[], not_found=[100])
+    assert session.execute(select(func.count()).select_from(BookORM)).scalar() == len(TEST_BOOKS) - 2
+
+
+def test_delete_books_by_ids_retry_deletes_the_rest(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+    delete_books_by_ids(session, [2, 3])
+
+    result = delete_books_by_ids(session, [2, 3, 4])
+
+    assert result == BulkDeleteResponse(deleted=[4], skipped=[], not_found=[2, 3])
+
+
+def test_delete_book_by_id_writes_tombstone(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    delete_book_by_id(session, 3)
+
+    assert session.execute(select(BookTombstoneORM.book_id, BookTombstoneORM.version)).all() == [
+        (3, len(TEST_BOOKS) + 1)
+    ]
+
+
+def test_delete_books_by_ids_writes_tombstones(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    delete_books_by_ids(session, [4, 2, 3])
+
+    assert session.execute(select(BookTombstoneORM.book_id, BookTombstoneORM.version)).all() == [
+        (2, len(TEST_BOOKS) + 1),
+        (3, len(TEST_BOOKS) + 2),
+        (4, len(TEST_BOOKS) + 3),
+    ]
+
+
+def test_get_book_changes(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+    update_books(session, [UpdateBook(id=1, title="updated_title")])
+    delete_book_by_id(session, 3)
+
+    result = get_book_changes(session, since=6)
+
+    assert result == BookChangesResponse(
+        changes=[
+            BookChange(version=7, id=6, book=TEST_BOOKS[6]),
+            BookChange(version=8, id=7, book=TEST_BOOKS[7]),
+            BookChange(version=9, id=1, book=TEST_BOOKS[1].model_copy(update={"title": "updated_title"})),
+            BookChange(version=10, id=3, deleted=True),
+        ],
+        next_token=10,
+        has_more=False,
+    )
+
+
+def test_get_book_changes_paginated(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+    delete_book_by_id(session, 3)
+
+    first_page = get_book_changes(session, limit=5)
+    second_page = get_book_changes(session, since=first_page.next_token, limit=5)
+    last_page = get_book_changes(session, since=second_page.next_token, limit=5)
+
+    assert [change.id for change in first_page.changes] == [0, 1, 2, 4, 5]
+    assert first_page.has_more
+    assert [(change.id, change.deleted) for change in second_page.changes] == [(6, False), (7, False), (3, True)]
+    assert not second_page.has_more
+    assert last_page == BookChangesResponse(changes=[], next_token=second_page.next_token, has_more=False)
+
+
+def test_events_published_after_commit(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    with patch("librarymanagement.repository.crud.event_bus") as mock_event_bus:
+        inserted_book = insert_book(
+            session, NewBook(title="Book 9", author="Author 9", genre="Genre 1", publication_year=2029)
+        )
+        update_books(session, [UpdateBook(id=1, title="updated_title")])
+        delete_book_by_id(session, 3)
+        delete_books_by_ids(session, [4, 5])
+
+        version = len(TEST_BOOKS)
+        assert mock_event_bus.publish.call_args_list == [
+            call("created", inserted_book.id, version + 1, inserted_book),
+            call("updated", 1, version + 2, BookRow(**TEST_BOOKS[1].model_dump())._replace(title="updated_title")),
+            call("deleted", 3, version + 3, None),
+            call("deleted", 4, version + 4, None),
+            call("deleted", 5, version + 5, None),
+        ]
+
+
+def test_events_not_published_on_rollback(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+
+    with patch("librarymanagement.repository.crud.event_bus") as mock_event_bus:
+        with pytest.raises(InvalidBookIdException):
+            update_books(session, [UpdateBook(id=1, title="updated_title"), UpdateBook(id=100, title="invalid")])
+        session.commit()
+
+        mock_event_bus.publish.assert_not_called()
@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import Session
+
+from librarymanagement.core.exeptions import SchemaMismatchException
+from librarymanagement.repository.crud import delete_book_by_id, find_duplicate, get_book_changes, insert_book
+from librarymanagement.repository.database import Base, ensure_schema, schema_fingerprint
+from librarymanagement.repository.models import BookORM  # noqa: F401, registers the tables
+from librarymanagement.service.schema import NewBook
+
+
+def test_ensure_schema_creates_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}")
+
+    assert ensure_schema(engine)
+
+    assert set(inspect(engine).get_table_names()) == set(Base.metadata.tables)
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA user_version").scalar() == schema_fingerprint(engine)
+
+
+def test_ensure_schema_skips_current_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}")
+    ensure_schema(engine)
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+    assert not ensure_schema(engine)
+    assert statements == ["PRAGMA user_version"]
+
+
+def test_ensure_schema_reruns_on_fingerprint_change(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}")
+    ensure_schema(engine)
+
+    monkeypatch.setattr("librarymanagement.repository.database.schema_fingerprint", lambda bind, metadata: 42)
+
+    assert ensure_schema(engine)
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA user_version").scalar() == 42
+
+
+def test_ensure_schema_adds_missing_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}")
+    ensure_schema(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_books_genre")
+        connection.exec_driver_sql("PRAGMA user_version = 0")
+
+    assert ensure_schema(engine)
+    assert "ix_books_genre" in {index["name"] for index in inspect(engine).get_indexes("books")}
+
+
+def test_ensure_schema_rejects_columns_without_migration(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE books (id INTEGER NOT NULL PRIMARY KEY, title VARCHAR NOT NULL)")
+
+    with pytest.raises(SchemaMismatchException) as exc_info:
+        ensure_schema(engine)
+
+    assert "books.author" in exc_info.value.columns
+    # Nothing is created or stamped, the next start fails the same way
+    assert inspect(engine).get_table_names() == ["books"]
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA user_version").scalar() == 0
+
+
+def test_ensure_schema_migrates_books_without_versions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}")
+    with engine.begin() as connection:
+        # The books table as created before the change feed
+        connection.exec_driver_sql(
+            "CREATE TABLE books (id INTEGER NOT NULL, title VARCHAR NOT NULL, author VARCHAR NOT NULL, "
+            "publication_year INTEGER NOT NULL, genre VARCHAR NOT NULL, PRIMARY KEY (id))"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO books VALUES (1, 'Book 1', 'Author 1', 2021, 'Genre 1'), "
+            "(2, 'Book 2', 'Author 2', 2022, 'Genre 1')"
+        )
+
+    assert ensure_schema(engine)
+
+    with Session(engine) as db:
+        assert [(change.version, change.id) for change in get_book_changes(db).changes] == [(1, 1), (2, 2)]
+        assert find_duplicate(db, "book 2", "author 2", 2022).id == 2
+        new_book = NewBook(title="Book 3", author="Author 3", genre="Genre 1", publication_year=2023)
+        inserted_book = insert_book(db, new_book)
+        delete_book_by_id(db, 1)
+        assert [(change.version, change.id) for change in get_book_changes(db, since=2).changes] == [
+            (3, inserted_book.id),
+            (4, 1),
+        ]
+    assert not ensure_schema(engine)
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import create_engine, select, update, func
+from sqlalchemy.orm import sessionmaker
+
+from librarymanagement.core.settings import settings
+from librarymanagement.repository.database import Base
+from librarymanagement.repository.idempotency_store import IdempotencyStore, StoredResponse
+from librarymanagement.repository.models import IdempotencyKeyORM
+
+
+RESPONSE = StoredResponse("hash", 200, "application/json", b'{"id": 1}')
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def store(session_factory):
+    return IdempotencyStore(session_factory)
+
+
+def expire(session_factory, key: str):
+    with session_factory() as db:
+        db.execute(
+            update(IdempotencyKeyORM)
+            .where(IdempotencyKeyORM.key == key)
+            .values(created_at=func.datetime("now", f"-{settings.idempotency_key_ttl_s + 1} seconds"))
+        )
+        db.commit()
+
+
+def test_put_and_get(store):
+    store.put("key", RESPONSE)
+
+    assert store.get("key") == RESPONSE
+    assert store.get("other") is None
+
+
+def test_put_keeps_first_response(store):
+    store.put("key", RESPONSE)
+    store.put("key", RESPONSE._replace(body=b'{"id": 2}'))
+
+    assert store.get("key") == RESPONSE
+
+
+def test_expired_key_is_ignored_and_overwritten(store, session_factory):
+    store.put("key", RESPONSE)
+    expire(session_factory, "key")
+
+    assert store.get("key") is None
+
+    store.put("key", RESPONSE._replace(body=b'{"id": 2}'))
+    assert store.get("key").body == b'{"id": 2}'
+
+
+def test_compact_deletes_expired_keys(store, session_factory):
+    store.put("expired", RESPONSE)
+    store.put("current", RESPONSE)
+    expire(session_factory, "expired")
+
+    assert store.compact() == 1
+    with session_factory() as db:
+        assert db.execute(select(IdempotencyKeyORM.key)).scalars().all() == ["current"]
+
+
+def test_put_compacts_periodically(store, session_factory, monkeypatch):
+    store.put("expired", RESPONSE)
+    expire(session_factory, "expired")
+    monkeypatch.setattr(settings, "idempotency_compaction_interval_s", 0)
+
+    store.put("current", RESPONSE)
+
+    with session_factory() as db:
+        assert db.execute(select(IdempotencyKeyORM.key)).scalars().all() == ["current"]
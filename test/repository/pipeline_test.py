@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, event, select, func
+from sqlalchemy.orm import sessionmaker
+
+from librarymanagement.core.exeptions import InvalidBookIdException, LastBookGenreDeleteException
+from librarymanagement.repository.crud import stage_insert_book, stage_update_books, stage_delete_book_by_id
+from librarymanagement.repository.database import Base
+from librarymanagement.repository.models import BookORM
+from librarymanagement.repository.pipeline import WritePipeline
+from librarymanagement.service.schema import BookRow, NewBook, UpdateBook
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def commits(engine):
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(conn))
+    return commits
+
+
+@pytest.fixture
+def pipeline(engine):
+    pipeline = WritePipeline(sessionmaker(bind=engine))
+    pipeline.start(max_batch_size=100, max_batch_delay=0.2)
+    yield pipeline
+    pipeline.stop()
+
+
+def new_book(index: int, genre: str = "Genre 1") -> NewBook:
+    return NewBook(title=f"Book {index}", author="Author", genre=genre, publication_year=2000 + index)
+
+
+def test_concurrent_inserts_are_group_committed(engine, commits, pipeline):
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        results = list(executor.map(lambda i: pipeline.submit(stage_insert_book, new_book(i)), range(10)))
+
+    assert sorted(book.title for book in results) == [f"Book {i}" for i in range(10)]
+    assert len({book.id for book in results}) == 10
+    assert len(commits) == 1
+    with sessionmaker(bind=engine)() as session:
+        assert session.execute(select(func.count()).select_from(BookORM)).scalar() == 10
+
+
+def test_batch_size_limits_group_commit(engine, commits):
+    pipeline = WritePipeline(sessionmaker(bind=engine))
+    pipeline.start(max_batch_size=2, max_batch_delay=0.2)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda i: pipeline.submit(stage_insert_book, new_book(i)), range(4)))
+    finally:
+        pipeline.stop()
+
+    assert len(commits) == 2
+
+
+def test_failing_operation_does_not_affect_batch(engine, pipeline):
+    inserted = pipeline.submit(stage_insert_book, new_book(0))
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        update = executor.submit(pipeline.submit, stage_update_books, [UpdateBook(id=inserted.id, title="Updated")])
+        invalid = executor.submit(pipeline.submit, stage_update_books, [UpdateBook(id=100, title="Invalid")])
+        last_in_genre = executor.submit(pipeline.submit, stage_delete_book_by_id, inserted.id)
+
+        assert update.result() == [
+            BookRow(id=inserted.id, title="Updated", author="Author", genre="Genre 1", publication_year=2000)
+        ]
+        with pytest.raises(InvalidBookIdException):
+            invalid.result()
+        with pytest.raises(LastBookGenreDeleteException):
+            last_in_genre.result()
+
+    with sessionmaker(bind=engine)() as session:
+        assert session.execute(select(BookORM.title)).scalars().all() == ["Updated"]
+
+
+def test_failing_operation_is_rolled_back_to_its_savepoint(engine, commits, pipeline):
+    def insert_then_fail(db, book):
+        stage_insert_book(db, book)
+        raise InvalidBookIdException(100)
+
+    with patch("librarymanagement.repository.crud.event_bus") as mock_event_bus:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            first = executor.submit(pipeline.submit, stage_insert_book, new_book(0))
+            failing = executor.submit(pipeline.submit, insert_then_fail, new_book(1))
+            last = executor.submit(pipeline.submit, stage_insert_book, new_book(2))
+
+            with pytest.raises(InvalidBookIdException):
+                failing.result()
+            inserted = [first.result(), last.result()]
+
+    assert len(commits) == 1
+    assert sorted(call.args[3] for call in mock_event_bus.publish.call_args_list) == sorted(inserted)
+    with sessionmaker(bind=engine)() as session:
+        assert session.execute(select(BookORM.title).order_by(BookORM.id)).scalars().all() == ["Book 0", "Book 2"]
+
+
+def test_stop_flushes_pending_operations(engine):
+    pipeline = WritePipeline(sessionmaker(bind=engine))
+    pipeline.start(max_batch_size=100, max_batch_delay=10)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        result = executor.submit(pipeline.submit, stage_insert_book, new_book(0))
+        pipeline.stop()
+
+        assert result.result().title == "Book 0"
+    assert not pipeline.running
@@ -0,0 +1,242 @@
+import threading
+import time
+from unittest.mock import patch, call
+
+import pytest
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+
+from librarymanagement.core.exeptions import (
+    InvalidBookIdException,
+    LastBookGenreDeleteException,
+    DuplicateBookException,
+)
+from librarymanagement.repository.crud import find_duplicate, stage_delete_books_by_ids
+from librarymanagement.repository.models import BookORM, BookShardORM
+from librarymanagement.repository.sharding import ShardedStorage
+from librarymanagement.service.schema import BookRow, BulkDeleteResponse, NewBook, UpdateBook
+
+
+# With three shards these genres hash to shards 0, 1, 2 and 2
+GENRES = ["Genre 2", "Genre 1", "Genre 3", "Genre 4"]
+
+TEST_BOOKS = [
+    NewBook(title="Book 1", author="Author 1", genre="Genre 1", publication_year=2021),
+    NewBook(title="Book 2", author="Author 2", genre="Genre 2", publication_year=2022),
+    NewBook(title="Book 3", author="Author 3", genre="Genre 3", publication_year=2023),
+    NewBook(title="Book 4 aaa", author="Author 4", genre="Genre 3", publication_year=2024),
+    NewBook(title="Book 5 aaa", author="Author 5", genre="Genre 4", publication_year=2025),
+    NewBook(title="Book 6", author="Author 5", genre="Genre 1", publication_year=2026),
+]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = ShardedStorage(str(tmp_path), 3)
+    storage.ensure_schema()
+    for book in TEST_BOOKS:
+        storage.insert_book(book)
+    return storage
+
+
+def shard_books(storage: ShardedStorage, shard: int) -> list[int]:
+    with Session(storage.shard_engines[shard]) as db:
+        return db.execute(select(BookORM.id).order_by(BookORM.id)).scalars().all()
+
+
+def test_genres_of_test_books_hash_to_expected_shards(storage):
+    assert [storage.shard_for_genre(genre) for genre in GENRES] == [0, 1, 2, 2]
+
+
+def test_insert_book_allocates_global_ids_in_genre_shard(storage):
+    assert shard_books(storage, 0) == [2]
+    assert shard_books(storage, 1) == [1, 6]
+    assert shard_books(storage, 2) == [3, 4, 5]
+    with Session(storage.directory_engine) as directory:
+        assert directory.execute(select(BookShardORM.id, BookShardORM.shard)).all() == [
+            (1, 1),
+            (2, 0),
+            (3, 2),
+            (4, 2),
+            (5, 2),
+            (6, 1),
+        ]
+
+
+def test_insert_book_finds_duplicates_in_other_shards(storage):
+    duplicate = NewBook(title="book 2", author="author 2", genre="Genre 1", publication_year=2022)
+
+    with pytest.raises(DuplicateBookException):
+        storage.insert_book(duplicate, "reject")
+    assert storage.insert_book(duplicate, "return_existing").id == 2
+    with Session(storage.directory_engine) as directory:
+        assert len(directory.execute(select(BookShardORM.id)).all()) == len(TEST_BOOKS)
+
+
+def test_get_all_books_merges_shards_by_id(storage):
+    assert storage.get_all_books() == [BookRow(id=i + 1, **book.model_dump()) for i, book in enumerate(TEST_BOOKS)]
+
+
+def test_get_all_books_with_filter(storage):
+    books = storage.get_all_books(author="Author 5", title="aaa", excluded_genres=["Genre 1"])
+
+    assert [book.id for book in books] == [4, 5]
+
+
+def test_get_book_by_id(storage):
+    assert storage.get_book_by_id(2) == BookRow(id=2, **TEST_BOOKS[1].model_dump())
+
+
+def test_get_book_by_id_invalid_id(storage):
+    with pytest.raises(InvalidBookIdException):
+        storage.get_book_by_id(100)
+
+
+def test_update_books_in_place_and_across_shards(storage):
+    updated_books = storage.update_books(
+        [UpdateBook(id=1, title="Updated"), UpdateBook(id=2, genre="Genre 3"), UpdateBook(id=3, genre="Genre 4")]
+    )
+
+    assert [(book.id, book.title, book.genre) for book in updated_books] == [
+        (1, "Updated", "Genre 1"),
+        (2, "Book 2", "Genre 3"),
+        (3, "Book 3", "Genre 4"),
+    ]
+    assert shard_books(storage, 0) == []
+    assert shard_books(storage, 2) == [2, 3, 4, 5]
+    assert storage.get_book_by_id(2) == updated_books[1]
+
+
+@pytest.mark.parametrize("on_duplicate", ["reject", "return_existing"])
+@pytest.mark.parametrize(
+    "duplicate_id, title, author, publication_year", [(6, "book 6", "author 5", 2026), (3, "Book 3", "Author 3", 2023)]
+)
+def test_update_books_across_shards_rejects_duplicates(
+    storage, on_duplicate, duplicate_id, title, author, publication_year
+):
+    move = UpdateBook(id=2, genre="Genre 3", title=title, author=author, publication_year=publication_year)
+
+    with pytest.raises(DuplicateBookException) as exception:
+        storage.update_books([move], on_duplicate)
+
+    assert exception.value.id == duplicate_id
+    assert shard_books(storage, 0) == [2]
+    assert shard_books(storage, 2) == [3, 4, 5]
+
+
+def test_move_publishes_one_update(storage):
+    with patch("librarymanagement.repository.crud.event_bus") as mock_event_bus:
+        moved_book = storage.update_books([UpdateBook(id=2, genre="Genre 3", title="Moved")], "reject")[0]
+
+    assert mock_event_bus.publish.call_args_list == [call("updated", 2, 4, moved_book)]
+
+
+def test_update_books_rejected_in_one_shard_changes_nothing(storage):
+    duplicate = UpdateBook(id=4, title="Book 3", author="Author 3", publication_year=2023)
+    updates = [UpdateBook(id=1, title="Updated"), duplicate]
+
+    with pytest.raises(DuplicateBookException):
+        storage.update_books(updates, "reject")
+
+    assert storage.get_book_by_id(1).title == "Book 1"
+
+
+def test_update_books_invalid_id_changes_nothing(storage):
+    with pytest.raises(InvalidBookIdException):
+        storage.update_books([UpdateBook(id=1, title="Updated"), UpdateBook(id=100, title="Invalid")])
+
+    assert storage.get_book_by_id(1).title == "Book 1"
+
+
+def test_delete_book_by_id(storage):
+    storage.delete_book_by_id(3)
+
+    assert shard_books(storage, 2) == [4, 5]
+    with pytest.raises(InvalidBookIdException):
+        storage.get_book_by_id(3)
+
+
+def test_delete_book_by_id_last_in_genre(storage):
+    with pytest.raises(LastBookGenreDeleteException):
+        storage.delete_book_by_id(2)
+
+
+def test_delete_books_by_ids_across_shards(storage):
+    assert storage.delete_books_by_ids([1, 2, 5, 3, 6]) == BulkDeleteResponse(deleted=[1, 3], skipped=[2, 5, 6])
+    assert [book.id for book in storage.get_all_books()] == [2, 4, 5, 6]
+
+
+def test_delete_books_by_ids_not_found(storage):
+    # Book 4 is still in the directory, but no longer in its shard
+    with Session(storage.shard_engines[2]) as db:
+        db.execute(delete(BookORM).where(BookORM.id == 4))
+        db.commit()
+
+    result = storage.delete_books_by_ids([1, 100, 4])
+
+    assert result == BulkDeleteResponse(deleted=[1], skipped=[], not_found=[100, 4])
+    with Session(storage.directory_engine) as directory:
+        assert directory.execute(select(BookShardORM.id).order_by(BookShardORM.id)).scalars().all() == [2, 3, 5, 6]
+
+
+def test_delete_books_by_ids_failing_in_one_shard_deletes_nothing(storage):
+    def failing_stage_delete(db, book_ids):
+        if 4 in book_ids:
+            raise RuntimeError("disk I/O error")
+        return stage_delete_books_by_ids(db, book_ids)
+
+    with patch("librarymanagement.repository.sharding.stage_delete_books_by_ids", failing_stage_delete):
+        with pytest.raises(RuntimeError):
+            storage.delete_books_by_ids([1, 4])
+
+    assert len(storage.get_all_books()) == len(TEST_BOOKS)
+
+
+def test_concurrent_duplicate_inserts_rejected(storage):
+    new_book = NewBook(title="New", author="Author", genre="Genre 1", publication_year=2030)
+    results = []
+
+    def slow_find_duplicate(*args, **kwargs):
+        # Without the write lock of the shard both inserts would find no duplicate in this window
+        duplicate = find_duplicate(*args, **kwargs)
+        time.sleep(0.2)
+        return duplicate
+
+    def insert():
+        try:
+            results.append(storage.insert_book(new_book, "reject").id)
+        except DuplicateBookException as e:
+            results.append(e)
+
+    with (
+        patch("librarymanagement.repository.sharding.find_duplicate", slow_find_duplicate),
+        patch("librarymanagement.repository.crud.find_duplicate", slow_find_duplicate),
+    ):
+        threads = [threading.Thread(target=insert) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert [isinstance(result, DuplicateBookException) for result in results].count(True) == 1
+    assert shard_books(storage, 1) == [1, 6, next(result for result in results if isinstance(result, int))]
+    with Session(storage.directory_engine) as directory:
+        assert len(directory.execute(select(BookShardORM.id)).all()) == len(TEST_BOOKS) + 1
+
+
+def test_writes_to_other_shards_are_not_blocked(storage):
+    # Hold the write lock of shard 0 while books are written to the other shards
+    with storage.shard_engines[0].connect() as connection:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        done = threading.Event()
+
+        def write_other_shards():
+            storage.insert_book(NewBook(title="New", author="Author", genre="Genre 1", publication_year=2030))
+            storage.update_books([UpdateBook(id=3, title="Updated")])
+            done.set()
+
+        thread = threading.Thread(target=write_other_shards)
+        thread.start()
+        assert done.wait(timeout=2)
+        thread.join()
+        connection.exec_driver_sql("ROLLBACK")
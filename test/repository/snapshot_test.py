@@ -0,0 +1,188 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from librarymanagement.core.settings import settings
+from librarymanagement.repository.crud import (
+    get_all_books,
+    insert_book,
+    update_books,
+    delete_book_by_id,
+    delete_books_by_ids,
+)
+from librarymanagement.repository.database import Base
+from librarymanagement.repository.snapshot import CatalogueSnapshot
+from librarymanagement.service.events import EventBus
+from librarymanagement.service.schema import BookEvent, BookRow, NewBook, UpdateBook
+from test.repository.crud_test import TEST_BOOKS, book_rows, orm_books, session  # noqa: F401
+
+
+@pytest.fixture
+def snapshot(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+    snapshot = CatalogueSnapshot()
+    snapshot.load(session)
+    return snapshot
+
+
+@pytest.mark.parametrize(
+    "author, title, excluded_genres",
+    [
+        (None, None, None),
+        ("Author 5", None, None),
+        ("author 5", None, ["Genre 3"]),
+        (None, "AAA", None),
+        (None, "aaa", ["Genre 3"]),
+        ("Author 5", "aaa", None),
+        ("Author 5", "aaa", ["Genre 3", "Genre 5", "Unknown"]),
+        ("nobody", None, None),
+    ],
+)
+def test_get_all_books_matches_crud(session, snapshot, author, title, excluded_genres):
+    result = snapshot.get_all_books(session, author=author, title=title, excluded_genres=excluded_genres)
+
+    assert result == get_all_books(session, author=author, title=title, excluded_genres=excluded_genres)
+
+
+def test_get_all_books_loads_on_first_use(session):
+    session.add_all(orm_books(TEST_BOOKS))
+    session.commit()
+    snapshot = CatalogueSnapshot()
+
+    assert snapshot.get_all_books(session) == book_rows(TEST_BOOKS)
+    assert snapshot.loaded
+    assert len(snapshot) == len(TEST_BOOKS)
+
+
+def test_apply_ignored_before_load():
+    snapshot = CatalogueSnapshot()
+
+    snapshot.apply(BookEvent(id=1, type="created", book_id=0, book=TEST_BOOKS[0]))
+
+    assert len(snapshot) == 0
+
+
+def test_apply_write_events(session, snapshot):
+    snapshot.apply(BookEvent(id=1, type="updated", book_id=1, book=TEST_BOOKS[1].model_copy(update={"genre": "New"})))
+    snapshot.apply(BookEvent(id=2, type="deleted", book_id=2))
+    snapshot.apply(BookEvent(id=3, type="created", book_id=8, book=TEST_BOOKS[0].model_copy(update={"id": 8})))
+
+    result = snapshot.get_all_books(session, excluded_genres=["Genre 1"])
+
+    assert [book.id for book in result] == [1, 3, 4, 5, 6, 7]
+    assert result[0].genre == "New"
+
+
+def test_reused_id_keeps_id_order(session, snapshot):
+    snapshot.apply(BookEvent(id=1, type="deleted", book_id=2))
+    snapshot.apply(BookEvent(id=2, type="created", book_id=2, book=TEST_BOOKS[2]))
+
+    assert snapshot.get_all_books(session) == book_rows(TEST_BOOKS)
+
+
+def test_compaction_after_many_deletes(session, snapshot):
+    for event_id, book_id in enumerate([2, 3, 4]):
+        snapshot.apply(BookEvent(id=event_id, type="deleted", book_id=book_id))
+
+    assert len(snapshot._ids) == len(TEST_BOOKS) - 3
+    assert snapshot.get_all_books(session) == book_rows([TEST_BOOKS[i] for i in (0, 1, 5, 6, 7)])
+
+
+def test_follows_committed_writes(session, snapshot, monkeypatch):
+    bus = EventBus()
+    bus.add_listener(snapshot.apply)
+    monkeypatch.setattr("librarymanagement.repository.crud.event_bus", bus)
+
+    inserted = insert_book(session, NewBook(title="New", author="Author 9", genre="Genre 1", publication_year=2030))
+    update_books(session, [UpdateBook(id=0, title="Updated")])
+    delete_books_by_ids(session, [2, 3])
+
+    assert snapshot.get_all_books(session) == get_all_books(session)
+    assert snapshot.get_all_books(session)[-1] == inserted
+    assert snapshot.get_all_books(session, title="updated") == [
+        BookRow(id=0, title="Updated", author="Author 1", genre="Genre 1", publication_year=2021)
+    ]
+
+
+def test_local_writes_are_not_replayed(session, snapshot, monkeypatch):
+    bus = EventBus()
+    bus.add_listener(snapshot.apply)
+    monkeypatch.setattr("librarymanagement.repository.crud.event_bus", bus)
+    delete_book_by_id(session, 2)
+
+    statements = []
+    event.listen(
+        session.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+    result = snapshot.get_all_books(session)
+
+    assert result == book_rows([book for book in TEST_BOOKS if book.id != 2])
+    assert snapshot.version == len(TEST_BOOKS) + 1
+    assert len(statements) == 1
+
+
+@pytest.fixture
+def worker_sessions(tmp_path):
+    """Sessions of two worker processes sharing one database file."""
+    engines = [create_engine(f"sqlite:///{tmp_path / 'library.db'}") for _ in range(2)]
+    Base.metadata.create_all(engines[0])
+    sessions = [sessionmaker(bind=engine)() for engine in engines]
+    sessions[1].add_all(orm_books(TEST_BOOKS))
+    sessions[1].commit()
+    yield sessions
+    for session in sessions:
+        session.close()
+
+
+def test_sync_picks_up_writes_of_other_workers(worker_sessions):
+    reader, writer = worker_sessions
+    snapshot = CatalogueSnapshot()
+    snapshot.get_all_books(reader)
+
+    update_books(writer, [UpdateBook(id=1, title="Updated")])
+    delete_book_by_id(writer, 3)
+    insert_book(writer, NewBook(title="New", author="Author 9", genre="Genre 1", publication_year=2030))
+
+    assert snapshot.get_all_books(reader) == get_all_books(writer)
+    assert snapshot.version == 11
+
+
+def test_sync_reads_only_data_version_when_current(worker_sessions):
+    reader, _ = worker_sessions
+    snapshot = CatalogueSnapshot()
+    snapshot.get_all_books(reader)
+
+    statements = []
+    event.listen(
+        reader.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+    snapshot.get_all_books(reader)
+
+    assert len(statements) == 1
+
+
+def test_sync_reloads_after_too_many_changes(worker_sessions, monkeypatch):
+    reader, writer = worker_sessions
+    snapshot = CatalogueSnapshot()
+    snapshot.get_all_books(reader)
+    monkeypatch.setattr(settings, "snapshot_max_replay", 0)
+
+    update_books(writer, [UpdateBook(id=book.id, title=f"Updated {book.id}") for book in TEST_BOOKS])
+
+    with monkeypatch.context() as patched:
+        loads = []
+        patched.setattr(snapshot, "load", lambda db: loads.append(db) or CatalogueSnapshot.load(snapshot, db))
+        assert snapshot.get_all_books(reader) == get_all_books(writer)
+        assert loads == [reader]
+
+
+def test_sync_disabled(worker_sessions, monkeypatch):
+    reader, writer = worker_sessions
+    snapshot = CatalogueSnapshot()
+    snapshot.get_all_books(reader)
+    monkeypatch.setattr(settings, "snapshot_coherence_check", False)
+
+    delete_book_by_id(writer, 3)
+
+    assert len(snapshot.get_all_books(reader)) == len(TEST_BOOKS)
@@ -1,8 +1,13 @@
 from unittest.mock import patch
 
-from librarymanagement.core.settings import settings
-from librarymanagement.service.books import group_books_by_genre, mask_title, mask_titles
-from librarymanagement.service.schema import Book, BookListResponse, BookGenre
+from librarymanagement.service.books import (
+    group_books_by_genre,
+    group_projected_books_by_genre,
+    mask_title,
+    mask_titles,
+    project_books,
+)
+from librarymanagement.service.schema import Book, BookListResponse, BookGenre, BookRow
 
 
 def test_group_books_by_genre():
@@ -129,8 +134,8 @@ def test_group_books_by_genre_empty():
     assert grouped_books == expected
 
 
-def test_mask_title():
-    settings.masked_genres = ["Fiction"]
+def test_mask_title(set_policy):
+    set_policy(masked_genres=["Fiction"])
 
     book = Book(
         id=10,
@@ -153,7 +158,39 @@ def test_mask_title():
     assert masked_book == expected
 
 
-def test_mask_titles():
+def test_mask_title_row(set_policy):
+    set_policy(masked_genres=["Fiction"])
+
+    book = BookRow(
+        id=10, title="The Great Gatsby", genre="Fiction", author="F. Scott Fitzgerald", publication_year=1925
+    )
+    other = BookRow(id=11, title="The Da Vinci Code", genre="Thriller", author="Dan Brown", publication_year=2003)
+
+    assert mask_title(book) == book._replace(title="**********")
+    assert book.title == "The Great Gatsby"
+    assert mask_title(other) is other
+
+
+def test_group_book_rows_by_genre():
+    books = [
+        BookRow(id=10, title="The Great Gatsby", genre="Fiction", author="F. Scott Fitzgerald", publication_year=1925),
+        BookRow(id=11, title="The Da Vinci Code", genre="Thriller", author="Dan Brown", publication_year=2003),
+        BookRow(id=12, title="The Catcher in the Rye", genre="Fiction", author="J. D. Salinger", publication_year=1951),
+    ]
+
+    expected = BookListResponse(
+        genres={
+            "Fiction": BookGenre(books=[Book(**books[0]._asdict()), Book(**books[2]._asdict())]),
+            "Thriller": BookGenre(books=[Book(**books[1]._asdict())]),
+        }
+    )
+
+    assert group_books_by_genre(books) == expected
+
+
+def test_mask_titles(set_policy):
+    set_policy(masked_genres=["Fiction"])
+
     books = [
         Book(
             id=10,
@@ -209,5 +246,37 @@ def test_mask_titles():
 
         assert masked_books == expected
         assert mock_mask_title.call_count == 2
-        mock_mask_title.assert_any_call(books[0])
-        mock_mask_title.assert_any_call(books[1])
+        mock_mask_title.assert_any_call(books[0], frozenset({"Fiction"}))
+        mock_mask_title.assert_any_call(books[1], frozenset({"Fiction"}))
+
+
+def test_project_books(set_policy):
+    set_policy(masked_genres=["Fiction"])
+
+    books = [
+        BookRow(id=10, title="The Great Gatsby", genre="Fiction", author="F. Scott Fitzgerald", publication_year=1925),
+        BookRow(id=11, title="The Da Vinci Code", genre="Thriller", author="Dan Brown", publication_year=2003),
+    ]
+
+    assert project_books(books, ("id", "title")) == [
+        {"id": 10, "title": "**********"},
+        {"id": 11, "title": "The Da Vinci Code"},
+    ]
+    assert project_books(books, ("author",)) == [{"author": "F. Scott Fitzgerald"}, {"author": "Dan Brown"}]
+
+
+def test_group_projected_books_by_genre(set_policy):
+    set_policy(masked_genres=[])
+
+    books = [
+        BookRow(id=10, title="The Great Gatsby", genre="Fiction", author="F. Scott Fitzgerald", publication_year=1925),
+        BookRow(id=11, title="The Da Vinci Code", genre="Thriller", author="Dan Brown", publication_year=2003),
+        BookRow(id=12, title="The Catcher in the Rye", genre="Fiction", author="J. D. Salinger", publication_year=1951),
+    ]
+
+    assert group_projected_books_by_genre(books, ("id",)) == {
+        "genres": {
+            "Fiction": {"books": [{"id": 10}, {"id": 12}], "count": 2},
+            "Thriller": {"books": [{"id": 11}], "count": 1},
+        }
+    }
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from librarymanagement.service.events import EventBus, stream_events
+from librarymanagement.service.schema import Book, BookEvent
+
+BOOK = Book(id=1, title="Book 1", author="Author 1", genre="Genre 1", publication_year=2020)
+
+
+async def collect(bus, subscription, count):
+    stream = stream_events(bus, subscription, keep_alive=0.01)
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        if len(chunks) == count:
+            break
+    await stream.aclose()
+    return chunks
+
+
+def test_publish_reaches_subscriber():
+    async def run():
+        bus = EventBus()
+        subscription = bus.subscribe()
+        bus.publish("created", 1, 1, BOOK)
+        return await subscription.get(1)
+
+    assert asyncio.run(run()) == BookEvent(id=1, type="created", book_id=1, book=BOOK)
+
+
+def test_subscribe_replays_after_last_event_id():
+    async def run():
+        bus = EventBus(replay_size=10)
+        for version in range(1, 6):
+            bus.publish("deleted", version, version)
+        subscription = bus.subscribe(last_event_id=3)
+        return [await subscription.get(1), await subscription.get(1)]
+
+    assert [event.id for event in asyncio.run(run())] == [4, 5]
+
+
+@pytest.mark.parametrize("last_event_id", [1, 100])
+def test_subscribe_outside_replay_buffer_resyncs(last_event_id):
+    async def run():
+        bus = EventBus(replay_size=3)
+        for version in range(1, 6):
+            bus.publish("deleted", version, version)
+        subscription = bus.subscribe(last_event_id=last_event_id)
+        return await subscription.get(1)
+
+    assert asyncio.run(run()) is None
+
+
+@pytest.mark.parametrize("versions", [[1, 2, 4], [2, 3]])
+def test_subscribe_with_missing_versions_resyncs(versions):
+    async def run():
+        bus = EventBus()
+        for version in versions:
+            bus.publish("deleted", version, version)
+        subscription = bus.subscribe(last_event_id=0)
+        return await subscription.get(1)
+
+    assert asyncio.run(run()) is None
+
+
+def test_subscribe_after_restart_resyncs():
+    async def run():
+        bus = EventBus()
+        bus.publish("deleted", 1, 11)
+        return await bus.subscribe(last_event_id=12).get(1)
+
+    assert asyncio.run(run()) is None
+
+
+def test_first_event_after_restart_is_streamed():
+    async def run():
+        bus = EventBus()
+        subscription = bus.subscribe()
+        bus.publish("created", 11, 11, BOOK)
+        event = await subscription.get(1)
+        bus.publish("deleted", 11, 13)
+        return [event, await subscription.get(1)]
+
+    assert [event and event.id for event in asyncio.run(run())] == [11, None]
+
+
+@pytest.mark.parametrize("last_event_id, resync", [(10, False), (9, True)])
+def test_subscribe_at_start_version(last_event_id, resync):
+    async def run():
+        bus = EventBus()
+        bus.start_at(10)
+        subscription = bus.subscribe(last_event_id=last_event_id)
+        bus.publish("created", 11, 11, BOOK)
+        return await subscription.get(1)
+
+    assert asyncio.run(run()) == (None if resync else BookEvent(id=11, type="created", book_id=11, book=BOOK))
+
+
+def test_skipped_version_resyncs():
+    async def run():
+        bus = EventBus()
+        bus.publish("deleted", 1, 11)
+        subscription = bus.subscribe()
+        bus.publish("deleted", 2, 12)
+        event = await subscription.get(1)
+        # Version 13 was written by another worker process
+        bus.publish("deleted", 3, 14)
+        return [event, await subscription.get(1)]
+
+    assert [event and event.id for event in asyncio.run(run())] == [12, None]
+
+
+def test_slow_subscriber_is_dropped_with_resync():
+    async def run():
+        bus = EventBus(subscriber_queue_size=2)
+        subscription = bus.subscribe()
+        for version in range(1, 4):
+            bus.publish("deleted", version, version)
+        await asyncio.sleep(0)
+        bus.publish("deleted", 4, 4)
+        await asyncio.sleep(0)
+        return subscription, await subscription.get(1)
+
+    subscription, event = asyncio.run(run())
+    assert event is None
+    assert subscription.lagged
+    assert subscription.queue.empty()
+
+
+def test_stream_events(set_policy):
+    set_policy(masked_genres=["Genre 1"])
+
+    async def run():
+        bus = EventBus()
+        subscription = bus.subscribe()
+        bus.publish("updated", 1, 1, BOOK)
+        chunks = await collect(bus, subscription, 2)
+        return bus, chunks
+
+    bus, chunks = asyncio.run(run())
+    masked = BookEvent(id=1, type="updated", book_id=1, book=BOOK.model_copy(update={"title": "*" * 10}))
+    assert chunks == [f"id: 1\nevent: updated\ndata: {masked.model_dump_json()}\n\n", ": keep-alive\n\n"]
+    assert BOOK.title == "Book 1"
+    assert not bus._subscribers
+
+
+def test_stream_events_resync():
+    async def run():
+        bus = EventBus(replay_size=1)
+        bus.publish("deleted", 1, 1)
+        bus.publish("deleted", 2, 2)
+        subscription = bus.subscribe(last_event_id=0)
+        return [chunk async for chunk in stream_events(bus, subscription)]
+
+    assert asyncio.run(run()) == ["event: resync\ndata: {}\n\n"]